@@ -0,0 +1,152 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Boot scaling benchmark.
+
+Boots the same system with an increasing number of harts (up to the
+start marker of the guest script, with --boot-only) and reports the host
+time of the configuration, of the instantiation and of the boot, the
+simulated boot time and the peak host memory of gem5 for each hart
+count. The runs are done one at a time, so that the host times can be
+compared.
+
+    python3 boot_scaling.py [gem5 binary] [fw_payload.elf] \\
+        [rootfs.ext2] --harts 1,4,16,64 --cpu-type atomic
+
+Arguments after -- are passed to the run script, e.g., -- --vmlinux
+[vmlinux] adds the kernel boot phases of each run to the report.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from stats_file import readJson
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_options():
+    parser = argparse.ArgumentParser(description='Measures the host and '
+                'simulated boot time against the number of harts.')
+    parser.add_argument("gem5", help="Path to the gem5 binary")
+    parser.add_argument("sbi", help="Path to the opensbi binary with "
+                        "kernel payload")
+    parser.add_argument("disk", help="Path to the disk image")
+    parser.add_argument("--harts", default="1,2,4,8,16,32,64",
+                        help="Comma separated hart counts "
+                        "(default: %(default)s)")
+    parser.add_argument("--cpu-type", default="atomic",
+                        help="CPU type (default: %(default)s)")
+    parser.add_argument("--script", default="run_untrusted.py",
+                        help="Run script to use (default: %(default)s)")
+    parser.add_argument("--outdir", default="boot-scaling-out",
+                        help="Directory for the gem5 output directories "
+                        "and the report")
+
+    # Everything after -- is for the run script
+    argv = sys.argv[1:]
+    extra = []
+    if "--" in argv:
+        argv, extra = argv[:argv.index("--")], argv[argv.index("--") + 1:]
+    args = parser.parse_args(argv)
+    args.extra = extra
+    return args
+
+def bootRun(args, harts, outdir):
+    """
+    Boots the system with harts harts and returns the measurements as a
+    dictionary, or None if the boot failed.
+    """
+    command = [args.gem5, "-re", "-d", outdir,
+               os.path.join(CONFIG_DIR, args.script),
+               "--boot-only", "--profile", *args.extra,
+               args.sbi, args.disk, args.cpu_type, str(harts), "aes"]
+    process = subprocess.Popen(command)
+    # The rusage of this process only, the peak memory of the children
+    # so far would include the previous (smaller) runs
+    _, status, usage = os.wait4(process.pid, 0)
+    if status != 0:
+        return None
+
+    profile = readJson(outdir, "profile.json")
+    phases = {phase["phase"]: phase for phase in profile["phases"]}
+    boot = phases["simulate:boot"]
+    result = {
+        "harts": harts,
+        "config_seconds": phases["config"]["wall_seconds"],
+        "instantiate_seconds": phases["instantiate"]["wall_seconds"],
+        "boot_host_seconds": boot["wall_seconds"],
+        "boot_sim_seconds": boot["sim_ticks"] / 1e12,
+        "host_seconds_per_sim_second":
+            boot["wall_seconds"] / (boot["sim_ticks"] / 1e12)
+            if boot["sim_ticks"] else None,
+        # ru_maxrss is in kB on Linux
+        "peak_host_memory_mb": usage.ru_maxrss / 1024,
+    }
+
+    timeline = readJson(outdir, "boot_timeline.json")
+    if timeline:
+        result["boot_phases"] = {phase["phase"]: phase["ticks"] / 1e12
+                                 for phase in timeline["phases"]}
+    return result
+
+def main():
+    args = parse_options()
+
+    os.makedirs(args.outdir, exist_ok = True)
+
+    results = []
+    for harts in [int(harts) for harts in args.harts.split(",")]:
+        outdir = os.path.join(args.outdir, "harts-{}".format(harts))
+        result = bootRun(args, harts, outdir)
+        if result is None:
+            print("Boot with {} harts failed, see {}".format(harts, outdir))
+            continue
+        results.append(result)
+
+    with open(os.path.join(args.outdir, "boot_scaling.json"), "w") as out:
+        json.dump(results, out, indent=4)
+
+    print("{:>6} {:>10} {:>12} {:>12} {:>12} {:>12} {:>10}".format(
+          "harts", "config", "instantiate", "boot host", "boot sim",
+          "host/sim", "memory"))
+    for result in results:
+        print("{:>6} {:>9.2f}s {:>11.2f}s {:>11.2f}s {:>11.4f}s {:>12} "
+              "{:>8.0f}MB".format(result["harts"],
+              result["config_seconds"], result["instantiate_seconds"],
+              result["boot_host_seconds"], result["boot_sim_seconds"],
+              "{:.0f}".format(result["host_seconds_per_sim_second"])
+              if result["host_seconds_per_sim_second"] else "-",
+              result["peak_host_memory_mb"]))
+
+    sys.exit(0 if results else 1)
+
+if __name__ == "__main__":
+    main()
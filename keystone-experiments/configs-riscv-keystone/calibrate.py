@@ -0,0 +1,243 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Calibration of the model against measured cycle counts.
+
+Takes the cycles of the rv8 benchmarks measured on a board (CSV with the
+columns bench and cycles) and a parameter space (JSON, run script option
+-> list of values), simulates the benchmarks for points of the space
+with the sweep launcher and reports the points with the smallest mean
+absolute percentage error of the simulated cycles (system.cpu.numCycles
+of the measured region).
+
+    {
+        "--cpu-preset": ["u54", "u74"],
+        "--l1-latency": [1, 2, 3],
+        "--dram": ["DDR3_1600_8x8", "DDR4_2400_8x8"],
+        "--cpu-param executeBranchDelay": [1, 2, 3]
+    }
+
+Options given as "--cpu-param name" are passed as --cpu-param name=value.
+Two searches are available: coordinate descent (one parameter at a time,
+from the first value of each, until no change improves the error) and a
+Latin hypercube sample of the space.
+
+    python3 calibrate.py [calibration directory] measured.csv space.json \\
+        --gem5 gem5.opt --sbi fw_payload.elf --disk rootfs.ext2 \\
+        --cpu-type minor --method coordinate
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import shlex
+
+from stats_file import readStats
+from sweep import Sweep
+
+CYCLES_STAT = "system.cpu.numCycles"
+
+def readMeasurements(file_name):
+    """ Returns the measured cycles of each benchmark in a CSV file """
+    with open(file_name) as measured:
+        return {row["bench"]: float(row["cycles"])
+                for row in csv.DictReader(measured)}
+
+def pointOptions(point):
+    """ Returns the run script options of a point (option -> value) """
+    options = []
+    for option, value in sorted(point.items()):
+        if option.startswith("--cpu-param "):
+            options += ["--cpu-param", "{}={}".format(option.split()[1],
+                                                       value)]
+        else:
+            options += [option, str(value)]
+    return options
+
+def pointName(point):
+    return hashlib.sha256(json.dumps(point, sort_keys = True).encode()
+                          ).hexdigest()[:12]
+
+class Calibration(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.dir = os.path.abspath(args.dir)
+        os.makedirs(self.dir, exist_ok = True)
+        self.measured = readMeasurements(args.measured)
+        with open(args.space) as space:
+            self.space = json.load(space)
+        self.errors = {}
+        self.batch = 0
+
+    def evaluate(self, points):
+        """
+        Simulates the benchmarks for the given points (those not
+        evaluated before) as one sweep and returns their errors.
+        """
+        new = [point for point in points
+               if pointName(point) not in self.errors]
+        if new:
+            self.batch += 1
+            jobs_file = os.path.join(self.dir,
+                                     "batch-{}.txt".format(self.batch))
+            with open(jobs_file, "w") as jobs:
+                for point in new:
+                    for bench in sorted(self.measured):
+                        args = pointOptions(point) + [self.args.sbi,
+                               self.args.disk, self.args.cpu_type, "1",
+                               bench]
+                        jobs.write("{}-{} {} {}\n".format(pointName(point),
+                                   bench, self.args.script,
+                                   " ".join(shlex.quote(arg)
+                                            for arg in args)))
+
+            Sweep(argparse.Namespace(dir = self.dir, jobs = jobs_file,
+                  gem5 = self.args.gem5, parallel = self.args.parallel,
+                  max_memory = self.args.max_memory,
+                  ckpt_interval = 0,
+                  results_store = self.args.results_store,
+                  retry_failed = False)).run()
+
+            for point in new:
+                self.errors[pointName(point)] = (point, self.error(point))
+
+        return [self.errors[pointName(point)][1] for point in points]
+
+    def error(self, point):
+        """
+        Returns the mean absolute percentage error of the simulated
+        cycles of a point, or None if a run failed.
+        """
+        errors = []
+        for bench, cycles in self.measured.items():
+            stats_file = os.path.join(self.dir, "{}-{}".format(
+                         pointName(point), bench), "stats.txt")
+            if not os.path.isfile(stats_file):
+                return None
+            dumps = readStats(stats_file)
+            if not dumps or CYCLES_STAT not in dumps[-1]:
+                return None
+            errors.append(abs(dumps[-1][CYCLES_STAT] - cycles) / cycles)
+        return 100 * sum(errors) / len(errors)
+
+    def coordinateDescent(self):
+        point = {option: values[0] for option, values in self.space.items()}
+        best = self.evaluate([point])[0]
+        for round in range(self.args.rounds):
+            improved = False
+            for option, values in self.space.items():
+                candidates = [dict(point, **{option: value})
+                              for value in values]
+                for candidate, error in zip(candidates,
+                                            self.evaluate(candidates)):
+                    if error is not None and (best is None or error < best):
+                        point, best, improved = candidate, error, True
+                print("Round {}, {}: best error {}".format(round + 1,
+                      option, "{:.2f}%".format(best)
+                      if best is not None else "-"))
+            if not improved:
+                break
+
+    def latinHypercube(self):
+        samples = self.args.samples
+        rng = random.Random(self.args.seed)
+        columns = {}
+        for option, values in self.space.items():
+            # One stratum per sample, spread over the values
+            strata = [int((i + rng.random()) * len(values) / samples)
+                      for i in range(samples)]
+            rng.shuffle(strata)
+            columns[option] = [values[i] for i in strata]
+        points = [{option: columns[option][i] for option in self.space}
+                  for i in range(samples)]
+        self.evaluate(points)
+
+    def report(self):
+        ranking = sorted(((error, point) for point, error in
+                          self.errors.values() if error is not None),
+                         key = lambda result: result[0])
+        with open(os.path.join(self.dir, "calibration.json"), "w") as out:
+            json.dump([{"error": error, "point": point}
+                       for error, point in ranking], out, indent=4)
+        for error, point in ranking[:self.args.top]:
+            print("{:8.2f}%  {}".format(error, " ".join(
+                  pointOptions(point))))
+        failed = sum(1 for _, error in self.errors.values() if error is None)
+        if failed:
+            print("{} points failed".format(failed))
+
+def main():
+    parser = argparse.ArgumentParser(description='Searches the model '
+                'parameters that best match measured cycle counts.')
+    parser.add_argument("dir", help="Calibration directory (sweep "
+                        "journal and output directories)")
+    parser.add_argument("measured", help="CSV with the measured cycles "
+                        "(columns bench and cycles)")
+    parser.add_argument("space", help="JSON parameter space (run script "
+                        "option -> list of values)")
+    parser.add_argument("--gem5", required=True,
+                        help="Path to the gem5 binary")
+    parser.add_argument("--sbi", required=True, help="Path to the opensbi "
+                        "binary with kernel payload")
+    parser.add_argument("--disk", required=True,
+                        help="Path to the disk image")
+    parser.add_argument("--cpu-type", default="minor",
+                        help="CPU type of the runs (default: %(default)s)")
+    parser.add_argument("--script", default="run_untrusted.py",
+                        help="Run script (default: %(default)s)")
+    parser.add_argument("--method", choices=["coordinate", "lhs"],
+                        default="coordinate", help="Search method "
+                        "(default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="Maximum rounds of coordinate descent")
+    parser.add_argument("--samples", type=int, default=32,
+                        help="Points of the Latin hypercube sample")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parallel", type=int, default=os.cpu_count(),
+                        help="Maximum number of jobs running at once")
+    parser.add_argument("--max-memory", help="Host memory for the jobs "
+                        "(see sweep.py)")
+    parser.add_argument("--results-store", help="Results store passed to "
+                        "the jobs")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Number of points to show")
+    args = parser.parse_args()
+
+    calibration = Calibration(args)
+    if args.method == "coordinate":
+        calibration.coordinateDescent()
+    else:
+        calibration.latinHypercube()
+    calibration.report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+A local library of post-boot checkpoints.
+
+Checkpoints are kept in a directory store and indexed in an SQLite
+database by a key computed from the content of the bootloader (bbl or
+OpenSBI with the kernel payload), the disk image and the DTB, and from
+the number of CPUs, the memory size and the kernel command line. Least
+recently used checkpoints are removed when the store grows beyond a
+given size. The physical memory of the checkpoints is kept compressed
+and deduplicated in a chunk store (see ckpt_store.py).
+
+The run scripts use this module (--ckpt-library) to restore a matching
+checkpoint or to create one on a miss. It can also be used from the
+command line to list the checkpoints and to collect garbage:
+
+    python3 ckpt_library.py [library directory] list
+    python3 ckpt_library.py [library directory] gc --max-size 50GB
+"""
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from ckpt_store import ChunkStore
+
+# Guest script prefix used in library mode. The first time the script
+# runs, the guest asks for a checkpoint and then reads and runs the
+# script again. After a restore, the guest reads the script of the new
+# run instead, so one post-boot checkpoint works for any benchmark.
+CHECKPOINT_HOOK = '''if [ -z "$GEM5_RESTORED" ]; then
+    /sbin/m5 checkpoint
+    /sbin/m5 readfile | GEM5_RESTORED=1 sh
+    exit
+fi
+'''
+
+# Exit cause of the m5 checkpoint pseudo instruction
+CHECKPOINT_CAUSE = "checkpoint"
+
+def parseSize(value):
+    """ Converts sizes like 512MB or 50GB to bytes """
+    match = re.match(r"^(\d+)\s*([KMGT]?)i?B?$", value, re.IGNORECASE)
+    if not match:
+        raise ValueError("Invalid size {}".format(value))
+    shift = {"": 0, "k": 10, "m": 20, "g": 30, "t": 40}
+    return int(match.group(1)) << shift[match.group(2).lower()]
+
+def directorySize(dir):
+    return sum(os.path.getsize(os.path.join(base, name))
+               for base, _, names in os.walk(dir) for name in names)
+
+def writeCheckpointHook(file_name):
+    """
+    Prepends the checkpoint hook to the guest script in file_name.
+    """
+    with open(file_name) as script:
+        content = script.read()
+    with open(file_name, "w") as script:
+        script.write(CHECKPOINT_HOOK + content)
+
+class FileHashes(object):
+    """
+    Content hashes of input files, kept in the given SQLite database.
+    Hashing a disk image takes a while, so the hashes of files that did
+    not change since they were last hashed are remembered.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.db.execute('''CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            sha256 TEXT NOT NULL)''')
+        self.db.commit()
+
+    def hashFile(self, file_name):
+        """ Returns the sha256 of the content of the given file """
+        file_name = os.path.abspath(file_name)
+        stat = os.stat(file_name)
+        row = self.db.execute('''SELECT sha256 FROM file_hashes
+            WHERE path = ? AND size = ? AND mtime = ?''',
+            (file_name, stat.st_size, stat.st_mtime)).fetchone()
+        if row:
+            return row[0]
+
+        digest = hashlib.sha256()
+        with open(file_name, "rb") as data:
+            for chunk in iter(lambda: data.read(1 << 20), b""):
+                digest.update(chunk)
+
+        self.db.execute("INSERT OR REPLACE INTO file_hashes VALUES "
+                        "(?, ?, ?, ?)", (file_name, stat.st_size,
+                        stat.st_mtime, digest.hexdigest()))
+        self.db.commit()
+        return digest.hexdigest()
+
+    def key(self, files, **params):
+        """
+        Returns a key and a description (JSON) for the given input files
+        (name -> path), identified by their content, and parameters.
+        """
+        config = {name: self.hashFile(file_name)
+                  for name, file_name in files.items()}
+        config.update(params)
+        config = json.dumps(config, sort_keys = True)
+        return hashlib.sha256(config.encode()).hexdigest(), config
+
+class CheckpointLibrary(object):
+
+    def __init__(self, dir):
+        self.dir = os.path.abspath(dir)
+        self.store = os.path.join(self.dir, "store")
+        os.makedirs(self.store, exist_ok = True)
+        self.chunks = ChunkStore(os.path.join(self.dir, "chunks"))
+
+        # Several jobs can share a library, wait for the others' writes
+        self.db = sqlite3.connect(os.path.join(self.dir, "index.sqlite"),
+                                  timeout = 600)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS checkpoints (
+            key TEXT PRIMARY KEY,
+            dir TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL,
+            config TEXT NOT NULL)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS checkpoints_last_used
+            ON checkpoints (last_used)''')
+        self.db.commit()
+        self.file_hashes = FileHashes(self.db)
+
+    @contextlib.contextmanager
+    def lock(self, exclusive = True):
+        """
+        Holds the library lock. The chunks of a checkpoint are only live
+        once it is registered, so packing and registering a checkpoint
+        and collecting chunks hold it exclusively, and restores hold it
+        shared so that their checkpoint is not removed meanwhile.
+        """
+        with open(os.path.join(self.dir, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive
+                                   else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def hashFile(self, file_name):
+        """ Returns the sha256 of the content of the given file """
+        return self.file_hashes.hashFile(file_name)
+
+    def key(self, files, **params):
+        """
+        Returns the key and the description of a checkpoint for the
+        given input files (name -> path) and parameters.
+        """
+        return self.file_hashes.key(files, **params)
+
+    def lookup(self, key):
+        """
+        Returns the directory of the checkpoint with the given key or
+        None if there is no such checkpoint.
+        """
+        row = self.db.execute("SELECT dir FROM checkpoints WHERE key = ?",
+                              (key,)).fetchone()
+        if not row or not os.path.isdir(row[0]):
+            return None
+        self.db.execute("UPDATE checkpoints SET last_used = ? "
+                        "WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return row[0]
+
+    def checkout(self, key, out_dir):
+        """
+        Returns a directory gem5 can restore the checkpoint with the
+        given key from (reconstructed in out_dir) or None if there is no
+        such checkpoint.
+        """
+        with self.lock(exclusive = False):
+            dir = self.lookup(key)
+            if dir:
+                return self.chunks.unpack(dir, out_dir)
+        return None
+
+    def newDirectory(self):
+        """
+        Returns a new directory in the store to write a checkpoint to
+        before adding it with add().
+        """
+        return tempfile.mkdtemp(prefix = "new-", dir = self.store)
+
+    def add(self, key, dir, config):
+        """
+        Adds the checkpoint in dir (from newDirectory()) with the given
+        key and description. If another job added the same checkpoint in
+        the meantime, dir is removed and the existing one is kept.
+        Returns the directory of the checkpoint in the store.
+        """
+        # A garbage collection between pack() and the registration would
+        # remove the new chunks
+        with self.lock():
+            self.chunks.pack(dir)
+
+            final_dir = os.path.join(self.store, key)
+            try:
+                os.rename(dir, final_dir)
+            except OSError:
+                shutil.rmtree(dir)
+                return final_dir
+
+            now = time.time()
+            self.db.execute("INSERT OR REPLACE INTO checkpoints VALUES "
+                            "(?, ?, ?, ?, ?, ?)", (key, final_dir,
+                            directorySize(final_dir), now, now, config))
+            self.db.commit()
+        return final_dir
+
+    def remove(self, key):
+        with self.lock():
+            row = self.db.execute("SELECT dir FROM checkpoints "
+                                  "WHERE key = ?", (key,)).fetchone()
+            if row:
+                shutil.rmtree(row[0], ignore_errors = True)
+                self.db.execute("DELETE FROM checkpoints WHERE key = ?",
+                                (key,))
+                self.db.commit()
+                self.chunks.gc([row[1] for row in self.checkpoints()])
+
+    def checkpoints(self):
+        """ Returns all checkpoints, most recently used first """
+        return self.db.execute('''SELECT key, dir, size, created, last_used,
+            config FROM checkpoints ORDER BY last_used DESC''').fetchall()
+
+    def size(self):
+        """ Returns the number of bytes used by the library """
+        return sum(row[2] for row in self.checkpoints()) + self.chunks.size()
+
+    def gc(self, max_size, keep = None):
+        """
+        Removes the least recently used checkpoints (except keep) until
+        the library is not larger than max_size bytes. Returns the keys
+        of the removed checkpoints.
+        """
+        removed = []
+        for key, _, _, _, _, _ in reversed(self.checkpoints()):
+            # Chunks are shared, so check the size after each removal
+            if self.size() <= max_size:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            removed.append(key)
+        return removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Manages a local library '
+                'of gem5 checkpoints.')
+    parser.add_argument("library", help="Path to the library directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the checkpoints")
+    gc_parser = subparsers.add_parser("gc", help="Remove the least "
+                    "recently used checkpoints")
+    gc_parser.add_argument("--max-size", required=True,
+                           help="Maximum size of the library (e.g., 50GB)")
+    remove_parser = subparsers.add_parser("remove",
+                        help="Remove a checkpoint")
+    remove_parser.add_argument("key", help="Key of the checkpoint")
+    args = parser.parse_args()
+
+    library = CheckpointLibrary(args.library)
+
+    if args.command == "list":
+        for key, dir, size, created, last_used, config in \
+                library.checkpoints():
+            print("{} {:>8}MB last used {}".format(key[:16], size >> 20,
+                  time.strftime("%Y-%m-%d %H:%M", time.localtime(last_used))))
+            print("    {}".format(config))
+    elif args.command == "gc":
+        for key in library.gc(parseSize(args.max_size)):
+            print("Removed {}".format(key[:16]))
+        print("Library size: {}MB".format(library.size() >> 20))
+    elif args.command == "remove":
+        library.remove(args.key)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Compressed and deduplicated storage of gem5 checkpoints.
+
+gem5 writes the whole physical memory of the system to a .pmem file in
+every checkpoint, although most of it is either zero or identical
+between checkpoints of the same boot. pack() replaces each .pmem file
+of a checkpoint with a small manifest listing the hashes of its
+fixed-size chunks. The chunks are compressed and stored once in a
+chunk store shared by all checkpoints. Zero chunks are not stored at
+all. unpack() reconstructs a checkpoint that gem5 can restore from.
+
+From the command line (e.g., for a set of SimPoint checkpoints):
+
+    python3 ckpt_store.py [store directory] pack [checkpoint directories]
+    python3 ckpt_store.py [store directory] unpack [checkpoint] [output]
+    python3 ckpt_store.py [store directory] gc [all checkpoint directories]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+
+# Suffix of the manifests that replace the .pmem files
+MANIFEST_SUFFIX = ".chunks"
+
+ZERO_CHUNK = bytes(CHUNK_SIZE)
+
+def isGzip(file_name):
+    with open(file_name, "rb") as data:
+        return data.read(2) == b"\x1f\x8b"
+
+def manifests(ckpt_dir):
+    return [name for name in os.listdir(ckpt_dir)
+            if name.endswith(".pmem" + MANIFEST_SUFFIX)]
+
+class ChunkStore(object):
+
+    def __init__(self, dir):
+        os.makedirs(dir, exist_ok = True)
+        # Several jobs can share a store, wait for the others' writes
+        self.db = sqlite3.connect(os.path.join(dir, "chunks.sqlite"),
+                                  timeout = 600)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS chunks (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL)''')
+        self.db.commit()
+
+    def size(self):
+        """ Returns the number of bytes used by the stored chunks """
+        return self.db.execute("SELECT IFNULL(SUM(LENGTH(data)), 0) "
+                               "FROM chunks").fetchone()[0]
+
+    def pack(self, ckpt_dir):
+        """
+        Moves the physical memory files of the checkpoint in ckpt_dir to
+        the store and replaces them with manifests. Returns the number of
+        bytes of newly stored chunks.
+        """
+        stored = 0
+        for name in os.listdir(ckpt_dir):
+            if not name.endswith(".pmem"):
+                continue
+            pmem = os.path.join(ckpt_dir, name)
+            compressed = isGzip(pmem)
+            chunks = []
+            size = 0
+            with (gzip.open if compressed else open)(pmem, "rb") as data:
+                for chunk in iter(lambda: data.read(CHUNK_SIZE), b""):
+                    size += len(chunk)
+                    # Only full zero chunks are left out of the store
+                    if chunk == ZERO_CHUNK:
+                        chunks.append(None)
+                        continue
+                    digest = hashlib.sha256(chunk).hexdigest()
+                    chunks.append(digest)
+                    cursor = self.db.execute("INSERT OR IGNORE INTO chunks "
+                        "VALUES (?, ?)", (digest, zlib.compress(chunk, 6)))
+                    if cursor.rowcount:
+                        stored += len(chunk)
+            self.db.commit()
+
+            with open(pmem + MANIFEST_SUFFIX, "w") as manifest:
+                json.dump({
+                    "size": size,
+                    "chunk_size": CHUNK_SIZE,
+                    "gzip": compressed,
+                    "chunks": chunks,
+                }, manifest)
+            os.remove(pmem)
+        return stored
+
+    def unpack(self, ckpt_dir, out_dir):
+        """
+        Writes a restorable copy of the packed checkpoint in ckpt_dir to
+        out_dir.
+        """
+        os.makedirs(out_dir, exist_ok = True)
+        for name in os.listdir(ckpt_dir):
+            if not name.endswith(MANIFEST_SUFFIX):
+                shutil.copy(os.path.join(ckpt_dir, name), out_dir)
+                continue
+
+            with open(os.path.join(ckpt_dir, name)) as manifest:
+                manifest = json.load(manifest)
+            pmem = os.path.join(out_dir, name[:-len(MANIFEST_SUFFIX)])
+            # The pmem file is only read once on restore, favor speed
+            with (gzip.open(pmem, "wb", compresslevel = 1)
+                  if manifest["gzip"] else open(pmem, "wb")) as data:
+                for digest in manifest["chunks"]:
+                    if digest is None:
+                        data.write(ZERO_CHUNK)
+                        continue
+                    row = self.db.execute("SELECT data FROM chunks WHERE "
+                                          "hash = ?", (digest,)).fetchone()
+                    if not row:
+                        raise RuntimeError("Chunk {} of {} is missing"
+                                           .format(digest, name))
+                    data.write(zlib.decompress(row[0]))
+        return out_dir
+
+    def gc(self, ckpt_dirs):
+        """
+        Removes the chunks not referenced by any of the given (packed)
+        checkpoints. Returns the number of removed chunks.
+        """
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS live "
+                        "(hash TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM live")
+        for ckpt_dir in ckpt_dirs:
+            for name in manifests(ckpt_dir):
+                with open(os.path.join(ckpt_dir, name)) as manifest:
+                    chunks = json.load(manifest)["chunks"]
+                self.db.executemany("INSERT OR IGNORE INTO live VALUES (?)",
+                    ((digest,) for digest in chunks if digest is not None))
+        cursor = self.db.execute("DELETE FROM chunks WHERE hash NOT IN "
+                                 "(SELECT hash FROM live)")
+        self.db.commit()
+        return cursor.rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description='Compressed and '
+                'deduplicated storage of gem5 checkpoints.')
+    parser.add_argument("store", help="Path to the chunk store directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="Move the physical "
+                      "memory of checkpoints to the store")
+    pack_parser.add_argument("checkpoints", nargs="+")
+    unpack_parser = subparsers.add_parser("unpack", help="Write a "
+                        "restorable copy of a packed checkpoint")
+    unpack_parser.add_argument("checkpoint")
+    unpack_parser.add_argument("output")
+    gc_parser = subparsers.add_parser("gc", help="Remove the chunks not "
+                    "used by the given checkpoints")
+    gc_parser.add_argument("checkpoints", nargs="*")
+    args = parser.parse_args()
+
+    store = ChunkStore(args.store)
+
+    if args.command == "pack":
+        for ckpt_dir in args.checkpoints:
+            stored = store.pack(ckpt_dir)
+            print("{}: {}MB of new chunks".format(ckpt_dir, stored >> 20))
+        print("Store size: {}MB".format(store.size() >> 20))
+    elif args.command == "unpack":
+        store.unpack(args.checkpoint, args.output)
+    elif args.command == "gc":
+        print("Removed {} chunks".format(store.gc(args.checkpoints)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Host side tools for gem5 copy-on-write disk overlays.
+
+The run scripts can keep the copy-on-write layer of the disk in a file
+(--disk-overlay), so many jobs can share one read-only base image while
+each carries its own small set of changed sectors. This module reads
+and writes that file format (the one of CowDiskImage in gem5) to create
+an overlay from the differences between two images, to inspect an
+overlay and to apply it to a base image:
+
+    python3 disk_overlay.py create [base image] [modified image] [overlay]
+    python3 disk_overlay.py info [overlay]
+    python3 disk_overlay.py apply [base image] [overlay] [output image]
+"""
+
+import argparse
+import os
+import shutil
+import struct
+
+SECTOR_SIZE = 512
+
+# Header of src/dev/storage/disk_image.cc. The integers are little
+# endian (SafeReadSwap/SafeWriteSwap use letoh/htole)
+MAGIC = b"COWDISK!"
+HEADER_SIZE = len(MAGIC) + 16
+VERSION = (1, 0)
+
+def readOverlay(file_name):
+    """ Returns the sectors (number -> data) in the given overlay """
+    with open(file_name, "rb") as overlay:
+        if overlay.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a COW disk overlay".format(
+                             file_name))
+        major, _, count = struct.unpack("<IIQ", overlay.read(16))
+        if major != VERSION[0]:
+            raise ValueError("Unsupported COW disk version {}".format(major))
+        # Also catches overlays written with the wrong byte order
+        if os.path.getsize(file_name) != HEADER_SIZE + \
+                                         count * (8 + SECTOR_SIZE):
+            raise ValueError("{} does not have {} sectors".format(
+                             file_name, count))
+        sectors = {}
+        for _ in range(count):
+            number, = struct.unpack("<Q", overlay.read(8))
+            sectors[number] = overlay.read(SECTOR_SIZE)
+    return sectors
+
+def writeOverlay(file_name, sectors):
+    """ Writes the given sectors (number -> data) as an overlay """
+    with open(file_name, "wb") as overlay:
+        overlay.write(MAGIC)
+        overlay.write(struct.pack("<IIQ", VERSION[0], VERSION[1],
+                                  len(sectors)))
+        for number in sorted(sectors):
+            data = sectors[number]
+            assert len(data) == SECTOR_SIZE
+            overlay.write(struct.pack("<Q", number))
+            overlay.write(data)
+
+def diffImages(base, modified, block_size = 1 << 20):
+    """
+    Returns the sectors (number -> data) of the modified image that are
+    different from the base image.
+    """
+    sectors = {}
+    with open(base, "rb") as old, open(modified, "rb") as new:
+        offset = 0
+        while True:
+            new_block = new.read(block_size)
+            if not new_block:
+                break
+            old_block = old.read(block_size)
+            if new_block != old_block:
+                for start in range(0, len(new_block), SECTOR_SIZE):
+                    sector = new_block[start:start + SECTOR_SIZE]
+                    if sector != old_block[start:start + SECTOR_SIZE]:
+                        sectors[(offset + start) // SECTOR_SIZE] = \
+                            sector.ljust(SECTOR_SIZE, b"\0")
+            offset += len(new_block)
+    return sectors
+
+def applyOverlay(base, overlay, output):
+    """ Writes a copy of the base image with the overlay applied """
+    shutil.copyfile(base, output)
+    with open(output, "r+b") as image:
+        for number, data in sorted(readOverlay(overlay).items()):
+            image.seek(number * SECTOR_SIZE)
+            image.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description='Creates, inspects and '
+                'applies gem5 copy-on-write disk overlays.')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser("create", help="Create an "
+                        "overlay from the differences between two images")
+    create_parser.add_argument("base")
+    create_parser.add_argument("modified")
+    create_parser.add_argument("overlay")
+    info_parser = subparsers.add_parser("info", help="Show the size of an "
+                      "overlay")
+    info_parser.add_argument("overlay")
+    apply_parser = subparsers.add_parser("apply", help="Write a copy of "
+                       "an image with an overlay applied")
+    apply_parser.add_argument("base")
+    apply_parser.add_argument("overlay")
+    apply_parser.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        sectors = diffImages(args.base, args.modified)
+        writeOverlay(args.overlay, sectors)
+        print("{} sectors changed".format(len(sectors)))
+    elif args.command == "info":
+        sectors = readOverlay(args.overlay)
+        print("{} sectors ({}kB)".format(len(sectors),
+              len(sectors) * SECTOR_SIZE >> 10))
+    elif args.command == "apply":
+        applyOverlay(args.base, args.overlay, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+A local SQLite database of experiments.
+
+Ingests gem5 output directories (the metadata from config.ini and
+result.json, the exit cause, the host timing and selected stats from
+stats.txt) into a database with indexed columns, so that sweeps of
+thousands of runs can be queried without parsing text files again.
+
+    python3 experiment_db.py results.sqlite ingest sweep/*/
+    python3 experiment_db.py results.sqlite query --stats simSeconds \\
+        --where "cpu_type = 'DerivO3CPU'" --format csv
+    python3 experiment_db.py results.sqlite pivot --rows bench \\
+        --columns cpu_type --value system.cpu.ipc
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from stats_file import readConfig, readJson, readStats
+
+# Stats ingested by default (regular expressions on the stat names)
+DEFAULT_STATS = [
+    r"sim(Seconds|Ticks|Insts|Ops)",
+    r"host(Seconds|InstRate|TickRate|MemUsage)",
+    r"system\.cpu\d*\.(ipc|cpi|numCycles|committedInsts)",
+    r"system\.cpu\d*\.[id]cache\.overallMissRate::total",
+    r"system\.cpu\d*\.mmucache\.overallMissRate::total",
+    r"system\.mem_cntrls\d*\.(avgRdBWSys|avgWrBWSys)",
+    r"system\.mem_cntrls\d*\.dram\.bwTotal::total",
+    r"system\.cpu\d*\.branchPred\.(lookups|condPredicted|condIncorrect|"
+        r"BTBLookups|BTBHits|indirectMispredicted|RASIncorrect)",
+    r"system\.cpu\d*\.(commit|iew)\.branchMispredicts",
+    r"system\.cpu\d*\.mmu\.[id]tb\.(accesses|misses)",
+    r"system\.cpu\d*\.walker_monitor\.readLatencyHist::(samples|mean)",
+    r".*\.power_model\.(dynamicPower|staticPower)",
+]
+
+# Columns of the runs table that can be used in --where, --rows, ...
+RUN_COLUMNS = ["id", "outdir", "ingested", "bench", "cpu_type",
+               "num_cpus", "exit_cause", "exit_code", "sim_ticks",
+               "host_seconds", "key", "options"]
+
+class ExperimentDatabase(object):
+
+    def __init__(self, file_name):
+        self.db = sqlite3.connect(file_name, timeout = 600)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            outdir TEXT UNIQUE NOT NULL,
+            ingested REAL NOT NULL,
+            bench TEXT,
+            cpu_type TEXT,
+            num_cpus INTEGER,
+            exit_cause TEXT,
+            exit_code INTEGER,
+            sim_ticks INTEGER,
+            host_seconds REAL,
+            key TEXT,
+            options TEXT,
+            num_dumps INTEGER NOT NULL)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS stats (
+            run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+            dump INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value REAL,
+            PRIMARY KEY (name, run, dump))''')
+        for column in ["bench", "cpu_type", "num_cpus", "exit_cause"]:
+            self.db.execute('''CREATE INDEX IF NOT EXISTS runs_{0}
+                ON runs ({0})'''.format(column))
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.commit()
+
+    def ingest(self, outdir, patterns = DEFAULT_STATS):
+        """
+        Adds (or replaces) the run in the given output directory with
+        the stats matching any of the given patterns. Returns False if
+        outdir is not a gem5 output directory.
+        """
+        outdir = os.path.abspath(outdir)
+        config_file = os.path.join(outdir, "config.ini")
+        stats_file = os.path.join(outdir, "stats.txt")
+        if not os.path.isfile(config_file):
+            return False
+
+        config = readConfig(config_file)
+        cpus = [name for name in config
+                if re.match(r"^system\.cpu\d*$", name)]
+        readfile = config.get("system", {}).get("readfile", "")
+        match = re.match(r"^run_(.*)$", os.path.basename(readfile))
+
+        run = {
+            "outdir": outdir,
+            "ingested": time.time(),
+            "bench": match.group(1) if match else None,
+            "cpu_type": config[cpus[0]]["type"] if cpus else None,
+            "num_cpus": len(cpus),
+        }
+
+        result = readJson(outdir, "result.json") or {}
+        for name in ["exit_cause", "exit_code", "sim_ticks",
+                     "host_seconds", "key"]:
+            run[name] = result.get(name)
+        if "options" in result:
+            run["options"] = json.dumps(result["options"], sort_keys = True)
+            run["bench"] = result["options"].get("bench", run["bench"])
+
+        dumps = readStats(stats_file) if os.path.isfile(stats_file) else []
+        run["num_dumps"] = len(dumps)
+
+        self.db.execute("DELETE FROM runs WHERE outdir = ?", (outdir,))
+        cursor = self.db.execute("INSERT INTO runs ({}) VALUES ({})".format(
+                    ", ".join(run), ", ".join("?" * len(run))),
+                    list(run.values()))
+
+        selected = re.compile("|".join("(?:{})$".format(pattern)
+                                       for pattern in patterns))
+        self.db.executemany("INSERT INTO stats VALUES (?, ?, ?, ?)",
+            [(cursor.lastrowid, i, name, value)
+             for i, dump in enumerate(dumps)
+             for name, value in dump.items()
+             if selected.match(name) and isinstance(value, float)])
+        self.db.commit()
+        return True
+
+    def query(self, columns, stats = [], where = None, dump = -1):
+        """
+        Returns the names and the rows of the given run columns and stats
+        for the runs matching the where clause (SQL on the runs table).
+        A stat can also be the ratio of two stats (name/name). Stats are
+        taken from the given dump, counted from the end if negative
+        (default: the last one).
+        """
+        if dump < 0:
+            dump_expr = "runs.num_dumps + {}".format(dump)
+        else:
+            dump_expr = str(dump)
+
+        select = ["runs.{}".format(column) for column in columns]
+        joins = []
+        names = []
+        for stat in stats:
+            values = []
+            for name in stat.split("/", 1):
+                i = len(names)
+                names.append(name)
+                values.append("s{}.value".format(i))
+                joins.append('''LEFT JOIN stats s{0} ON s{0}.run = runs.id
+                    AND s{0}.name = ? AND s{0}.dump = {1}'''.format(i,
+                    dump_expr))
+            if len(values) == 2:
+                select.append("{} / NULLIF({}, 0)".format(*values))
+            else:
+                select.append(values[0])
+
+        sql = "SELECT {} FROM runs {}".format(", ".join(select),
+                                              " ".join(joins))
+        if where:
+            sql += " WHERE " + where
+        sql += " ORDER BY runs.id"
+        return columns + stats, self.db.execute(sql, names).fetchall()
+
+    def statNames(self, pattern = ""):
+        """ Returns the names of the ingested stats matching pattern """
+        return [row[0] for row in self.db.execute(
+            "SELECT DISTINCT name FROM stats ORDER BY name")
+            if re.search(pattern, row[0])]
+
+def pivot(names, rows, row_keys, column_key, value):
+    """
+    Pivots query results: one row per combination of the row_keys and
+    one column per value of column_key, holding the mean of value.
+    Returns the names and the rows of the pivoted table.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    cells = {}
+    column_values = []
+    for row in rows:
+        key = tuple(row[index[name]] for name in row_keys)
+        column = row[index[column_key]]
+        if column not in column_values:
+            column_values.append(column)
+        if row[index[value]] is not None:
+            cells.setdefault(key, {}).setdefault(column, []).append(
+                row[index[value]])
+
+    table = []
+    for key in sorted(cells, key = str):
+        table.append(list(key) + [
+            sum(cells[key][column]) / len(cells[key][column])
+            if column in cells[key] else None
+            for column in column_values])
+    return row_keys + [str(column) for column in column_values], table
+
+def write(names, rows, format, output):
+    """ Writes a table as text, CSV or a NumPy structured array """
+    if format == "npy":
+        try:
+            import numpy
+        except ImportError:
+            sys.exit("NumPy is needed for --format npy")
+        if not output:
+            sys.exit("--output is needed for --format npy")
+        types = []
+        for i, name in enumerate(names):
+            values = [row[i] for row in rows if row[i] is not None]
+            if values and all(isinstance(v, (int, float)) for v in values):
+                types.append((name, "f8"))
+            else:
+                types.append((name, "U{}".format(
+                              max([len(str(v)) for v in values] + [1]))))
+        array = numpy.array([tuple(numpy.nan if value is None and t == "f8"
+                             else ("" if value is None else value)
+                             for value, (_, t) in zip(row, types))
+                             for row in rows], dtype = types)
+        numpy.save(output, array)
+        return
+
+    out = open(output, "w", newline = "") if output else sys.stdout
+    if format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(names)
+        writer.writerows(rows)
+    else:
+        text = [[str(name) for name in names]] + \
+               [["" if value is None else "{:.6g}".format(value)
+                 if isinstance(value, float) else str(value)
+                 for value in row] for row in rows]
+        widths = [max(len(row[i]) for row in text)
+                  for i in range(len(names))]
+        for row in text:
+            out.write("  ".join(value.ljust(width) for value, width in
+                                zip(row, widths)).rstrip() + "\n")
+    if output:
+        out.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local database of '
+                'gem5 experiments.')
+    parser.add_argument("database", help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Add output "
+                        "directories to the database")
+    ingest_parser.add_argument("outdirs", nargs="+",
+                               help="gem5 output directories")
+    ingest_parser.add_argument("--stat", action="append",
+                               help="Regular expression of stat names to "
+                               "ingest, repeatable (default: a selection "
+                               "of the main stats)")
+    ingest_parser.add_argument("--all-stats", action="store_true",
+                               help="Ingest all stats")
+
+    stats_parser = subparsers.add_parser("stats", help="List the "
+                        "ingested stats")
+    stats_parser.add_argument("pattern", nargs="?", default="")
+
+    for name in ["query", "pivot"]:
+        query_parser = subparsers.add_parser(name,
+                            help="{} the runs".format(name.capitalize()))
+        query_parser.add_argument("--where", help="SQL condition on the "
+                                  "columns of the runs table ({})".format(
+                                  ", ".join(RUN_COLUMNS)))
+        query_parser.add_argument("--dump", type=int, default=-1,
+                                  help="Stats dump to use, negative from "
+                                  "the end (default: the last one)")
+        query_parser.add_argument("--format", default="table",
+                                  choices=["table", "csv", "npy"])
+        query_parser.add_argument("--output", help="Output file "
+                                  "(default: standard output)")
+        if name == "query":
+            query_parser.add_argument("--columns",
+                default="id,bench,cpu_type,num_cpus,exit_cause,host_seconds",
+                help="Comma separated run columns (default: %(default)s)")
+            query_parser.add_argument("--stats", default="",
+                help="Comma separated stats or ratios of stats (a/b)")
+        else:
+            query_parser.add_argument("--rows", required=True,
+                help="Comma separated run columns of the rows")
+            query_parser.add_argument("--columns", required=True,
+                help="Run column of the columns")
+            query_parser.add_argument("--value", required=True,
+                help="Stat, ratio of stats (a/b) or run column to "
+                "average in the cells")
+    args = parser.parse_args()
+
+    database = ExperimentDatabase(args.database)
+
+    if args.command == "ingest":
+        patterns = [".*"] if args.all_stats else args.stat or DEFAULT_STATS
+        count = 0
+        for outdir in args.outdirs:
+            if database.ingest(outdir, patterns):
+                count += 1
+            else:
+                print("Skipping {}: no config.ini".format(outdir))
+        print("Ingested {} runs".format(count))
+    elif args.command == "stats":
+        for name in database.statNames(args.pattern):
+            print(name)
+    elif args.command == "query":
+        columns = args.columns.split(",")
+        stats = args.stats.split(",") if args.stats else []
+        names, rows = database.query(columns, stats, args.where, args.dump)
+        write(names, rows, args.format, args.output)
+    elif args.command == "pivot":
+        rows = args.rows.split(",")
+        if args.value in RUN_COLUMNS:
+            names, data = database.query(rows + [args.columns, args.value],
+                                         [], args.where, args.dump)
+        else:
+            names, data = database.query(rows + [args.columns],
+                                         [args.value], args.where, args.dump)
+        write(*pivot(names, data, rows, args.columns, args.value),
+              args.format, args.output)
+
+if __name__ == "__main__":
+    main()
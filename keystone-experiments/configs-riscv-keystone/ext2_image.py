@@ -0,0 +1,870 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Rootless creation and patching of ext2 disk images.
+
+Building a disk image normally needs root to mount it and to copy the
+root file system (or a new benchmark binary) into it. This module reads
+and writes the ext2 structures directly instead. A new image can be
+created from a directory tree, and files can be added to or replaced in
+an existing image (e.g., /root/exit.sh or an rv8-bench binary). Only the
+blocks that change are written, so updating a benchmark takes seconds.
+The changes can also go to a gem5 copy-on-write overlay instead of the
+image itself (see disk_overlay.py), leaving the base image untouched.
+
+Files are owned by root in the image. Images with ext3/ext4 features
+other than dir_index, ext_attr and resize_inode are not supported.
+
+    python3 ext2_image.py create [image] [directory] --size 512MB
+    python3 ext2_image.py put [image] [host path] [path in image]
+    python3 ext2_image.py put [image] [host path] [path in image] \\
+        --overlay [overlay]
+    python3 ext2_image.py ls [image] [path in image]
+    python3 ext2_image.py cat [image] [path in image]
+"""
+
+import argparse
+import math
+import os
+import stat
+import struct
+import sys
+import time
+import uuid
+
+from disk_overlay import SECTOR_SIZE, readOverlay, writeOverlay
+
+EXT2_MAGIC = 0xef53
+SUPERBLOCK_OFFSET = 1024
+SUPERBLOCK_SIZE = 1024
+GROUP_DESC_SIZE = 32
+INODE_SIZE = 128
+
+ROOT_INO = 2
+FIRST_INO = 11
+
+INCOMPAT_FILETYPE = 0x2
+RO_COMPAT_SPARSE_SUPER = 0x1
+RO_COMPAT_LARGE_FILE = 0x2
+
+# Directories with this flag have an htree index, which is not updated
+INDEX_FL = 0x1000
+
+# Directory entry file types (with the filetype feature)
+FILE_TYPES = {
+    stat.S_IFREG: 1,
+    stat.S_IFDIR: 2,
+    stat.S_IFCHR: 3,
+    stat.S_IFBLK: 4,
+    stat.S_IFIFO: 5,
+    stat.S_IFSOCK: 6,
+    stat.S_IFLNK: 7,
+}
+
+# Name -> (offset, format) of the superblock fields in use
+SUPERBLOCK_FIELDS = {
+    "inodes_count": (0, "I"),
+    "blocks_count": (4, "I"),
+    "r_blocks_count": (8, "I"),
+    "free_blocks_count": (12, "I"),
+    "free_inodes_count": (16, "I"),
+    "first_data_block": (20, "I"),
+    "log_block_size": (24, "I"),
+    "log_frag_size": (28, "I"),
+    "blocks_per_group": (32, "I"),
+    "frags_per_group": (36, "I"),
+    "inodes_per_group": (40, "I"),
+    "wtime": (48, "I"),
+    "max_mnt_count": (54, "h"),
+    "magic": (56, "H"),
+    "state": (58, "H"),
+    "errors": (60, "H"),
+    "lastcheck": (64, "I"),
+    "rev_level": (76, "I"),
+    "first_ino": (84, "I"),
+    "inode_size": (88, "H"),
+    "block_group_nr": (90, "H"),
+    "feature_compat": (92, "I"),
+    "feature_incompat": (96, "I"),
+    "feature_ro_compat": (100, "I"),
+    "uuid": (104, "16s"),
+    "volume_name": (120, "16s"),
+}
+
+# Name -> (offset, format) of the inode fields in use
+INODE_FIELDS = {
+    "mode": (0, "H"),
+    "uid": (2, "H"),
+    "size": (4, "I"),
+    "atime": (8, "I"),
+    "ctime": (12, "I"),
+    "mtime": (16, "I"),
+    "dtime": (20, "I"),
+    "gid": (24, "H"),
+    "links_count": (26, "H"),
+    "blocks": (28, "I"),
+    "flags": (32, "I"),
+    "size_high": (108, "I"),
+}
+
+class Ext2Error(Exception):
+    pass
+
+class Struct(object):
+    """ Named access to the fields of an on-disk structure """
+
+    def __init__(self, data, fields):
+        self.data = bytearray(data)
+        self.fields = fields
+
+    def __getitem__(self, name):
+        offset, fmt = self.fields[name]
+        return struct.unpack_from("<" + fmt, self.data, offset)[0]
+
+    def __setitem__(self, name, value):
+        offset, fmt = self.fields[name]
+        struct.pack_into("<" + fmt, self.data, offset, value)
+
+class Inode(Struct):
+
+    def __init__(self, number, data):
+        super(Inode, self).__init__(data, INODE_FIELDS)
+        self.number = number
+
+    @property
+    def block(self):
+        return list(struct.unpack_from("<15I", self.data, 40))
+
+    @block.setter
+    def block(self, pointers):
+        struct.pack_into("<15I", self.data, 40, *pointers)
+
+    def fileSize(self):
+        size = self["size"]
+        if stat.S_ISREG(self["mode"]):
+            size |= self["size_high"] << 32
+        return size
+
+    def setFileSize(self, size):
+        self["size"] = size & 0xffffffff
+        if stat.S_ISREG(self["mode"]):
+            self["size_high"] = size >> 32
+
+    def isFastSymlink(self):
+        return stat.S_ISLNK(self["mode"]) and self["blocks"] == 0
+
+class ImageFile(object):
+    """ Reads and writes an image in place """
+
+    def __init__(self, file_name):
+        self.file = open(file_name, "r+b")
+
+    def read(self, offset, size):
+        return os.pread(self.file.fileno(), size, offset).ljust(size, b"\0")
+
+    def write(self, offset, data):
+        os.pwrite(self.file.fileno(), data, offset)
+
+    def close(self):
+        self.file.close()
+
+class OverlayImage(object):
+    """
+    Reads a base image through a gem5 copy-on-write overlay and writes
+    the changed sectors to the overlay only.
+    """
+
+    def __init__(self, base, overlay, initial = None):
+        self.file = open(base, "rb")
+        self.overlay = overlay
+        self.sectors = readOverlay(initial) if initial else {}
+
+    def read(self, offset, size):
+        data = bytearray(os.pread(self.file.fileno(), size, offset)
+                         .ljust(size, b"\0"))
+        first = offset // SECTOR_SIZE
+        last = (offset + size - 1) // SECTOR_SIZE
+        if self.sectors and last - first < len(self.sectors):
+            numbers = range(first, last + 1)
+        else:
+            numbers = [n for n in self.sectors if first <= n <= last]
+        for number in numbers:
+            sector = self.sectors.get(number)
+            if sector is None:
+                continue
+            start = number * SECTOR_SIZE - offset
+            data[max(start, 0):start + SECTOR_SIZE] = \
+                sector[max(-start, 0):size - start]
+        return bytes(data)
+
+    def write(self, offset, data):
+        assert offset % SECTOR_SIZE == 0 and len(data) % SECTOR_SIZE == 0
+        for start in range(0, len(data), SECTOR_SIZE):
+            self.sectors[(offset + start) // SECTOR_SIZE] = \
+                bytes(data[start:start + SECTOR_SIZE])
+
+    def close(self):
+        writeOverlay(self.overlay, self.sectors)
+        self.file.close()
+
+class Ext2Image(object):
+
+    def __init__(self, device):
+        self.device = device
+        self.sb = Struct(device.read(SUPERBLOCK_OFFSET, SUPERBLOCK_SIZE),
+                         SUPERBLOCK_FIELDS)
+        if self.sb["magic"] != EXT2_MAGIC:
+            raise Ext2Error("Not an ext2 file system")
+        if self.sb["feature_incompat"] & ~INCOMPAT_FILETYPE or \
+           self.sb["feature_ro_compat"] & \
+                ~(RO_COMPAT_SPARSE_SUPER | RO_COMPAT_LARGE_FILE):
+            raise Ext2Error("Unsupported file system features (ext3/4?)")
+
+        self.block_size = 1024 << self.sb["log_block_size"]
+        self.inode_size = INODE_SIZE if self.sb["rev_level"] == 0 \
+                          else self.sb["inode_size"]
+        self.first_ino = FIRST_INO if self.sb["rev_level"] == 0 \
+                         else self.sb["first_ino"]
+        self.filetype = bool(self.sb["feature_incompat"] & INCOMPAT_FILETYPE)
+        self.num_groups = math.ceil((self.sb["blocks_count"] -
+            self.sb["first_data_block"]) / self.sb["blocks_per_group"])
+
+        self.gdt_offset = (self.sb["first_data_block"] + 1) * self.block_size
+        gdt = device.read(self.gdt_offset, self.num_groups * GROUP_DESC_SIZE)
+        self.groups = [list(struct.unpack_from("<IIIHHH", gdt,
+                       i * GROUP_DESC_SIZE)) for i in range(self.num_groups)]
+
+        # Metadata blocks changed since the last flush()
+        self.dirty = {}
+        # Next block to try to allocate, keeps new files contiguous
+        self.block_hint = 0
+
+    # Blocks
+
+    def readBlock(self, number):
+        if number in self.dirty:
+            return self.dirty[number]
+        return bytearray(self.device.read(number * self.block_size,
+                                          self.block_size))
+
+    def modifyBlock(self, number):
+        """ Returns the cached content of a block to be modified """
+        if number not in self.dirty:
+            self.dirty[number] = self.readBlock(number)
+        return self.dirty[number]
+
+    def writeData(self, blocks, data):
+        """ Writes data to the given blocks, merging contiguous runs """
+        bs = self.block_size
+        i = 0
+        while i < len(blocks):
+            j = i + 1
+            while j < len(blocks) and blocks[j] == blocks[j - 1] + 1:
+                j += 1
+            chunk = data[i * bs:j * bs]
+            self.device.write(blocks[i] * bs,
+                              chunk.ljust((j - i) * bs, b"\0"))
+            i = j
+
+    def flush(self):
+        """ Writes the changed metadata back to the image """
+        for number, data in sorted(self.dirty.items()):
+            self.device.write(number * self.block_size, bytes(data))
+        self.dirty = {}
+
+        gdt = bytearray(self.gdtSize())
+        for i, group in enumerate(self.groups):
+            struct.pack_into("<IIIHHH", gdt, i * GROUP_DESC_SIZE, *group)
+        self.device.write(self.gdt_offset, bytes(gdt))
+
+        self.sb["wtime"] = int(time.time())
+        self.device.write(SUPERBLOCK_OFFSET, bytes(self.sb.data))
+
+    def close(self):
+        self.flush()
+        self.device.close()
+
+    def gdtSize(self):
+        size = self.num_groups * GROUP_DESC_SIZE
+        return math.ceil(size / self.block_size) * self.block_size
+
+    # Allocation
+
+    def _allocBit(self, bitmap_block, start, limit):
+        """
+        Sets and returns the first clear bit at or after start (and below
+        limit) in the given bitmap block, or None if there is none.
+        """
+        bitmap = self.readBlock(bitmap_block)
+        byte = start // 8
+        while byte * 8 < limit:
+            if bitmap[byte] != 0xff:
+                for bit in range(max(start - byte * 8, 0), 8):
+                    index = byte * 8 + bit
+                    if index >= limit:
+                        return None
+                    if not bitmap[byte] & (1 << bit):
+                        self.modifyBlock(bitmap_block)[byte] |= 1 << bit
+                        return index
+            byte += 1
+        return None
+
+    def _clearBit(self, bitmap_block, index):
+        bitmap = self.modifyBlock(bitmap_block)
+        if not bitmap[index // 8] & (1 << index % 8):
+            raise Ext2Error("Freeing a free block or inode")
+        bitmap[index // 8] &= ~(1 << index % 8) & 0xff
+
+    def allocBlocks(self, count):
+        """ Allocates count blocks, contiguous where possible """
+        bpg = self.sb["blocks_per_group"]
+        first = self.sb["first_data_block"]
+        blocks = []
+        start = max(self.block_hint - first, 0)
+        group = start // bpg
+        index = start % bpg
+        for _ in range(self.num_groups + 1):
+            if len(blocks) == count:
+                break
+            limit = min(bpg, self.sb["blocks_count"] - first - group * bpg)
+            while len(blocks) < count and self.groups[group][3]:
+                index = self._allocBit(self.groups[group][0], index, limit)
+                if index is None:
+                    break
+                blocks.append(first + group * bpg + index)
+                self.groups[group][3] -= 1
+                index += 1
+            group = (group + 1) % self.num_groups
+            index = 0
+
+        if len(blocks) < count:
+            self.freeBlocks(blocks)
+            raise Ext2Error("No space left in the image")
+        self.sb["free_blocks_count"] -= count
+        self.block_hint = blocks[-1] + 1 if blocks else self.block_hint
+        return blocks
+
+    def freeBlocks(self, blocks):
+        bpg = self.sb["blocks_per_group"]
+        for block in blocks:
+            group, index = divmod(block - self.sb["first_data_block"], bpg)
+            self._clearBit(self.groups[group][0], index)
+            self.groups[group][3] += 1
+            self.sb["free_blocks_count"] += 1
+
+    def allocInode(self, directory = False):
+        ipg = self.sb["inodes_per_group"]
+        for group in range(self.num_groups):
+            if not self.groups[group][4]:
+                continue
+            start = self.first_ino - 1 if group == 0 else 0
+            index = self._allocBit(self.groups[group][1], start, ipg)
+            if index is None:
+                continue
+            self.groups[group][4] -= 1
+            if directory:
+                self.groups[group][5] += 1
+            self.sb["free_inodes_count"] -= 1
+            return group * ipg + index + 1
+        raise Ext2Error("No free inodes left in the image")
+
+    # Inodes
+
+    def _inodeLocation(self, number):
+        group, index = divmod(number - 1, self.sb["inodes_per_group"])
+        offset = index * self.inode_size
+        return (self.groups[group][2] + offset // self.block_size,
+                offset % self.block_size)
+
+    def readInode(self, number):
+        block, offset = self._inodeLocation(number)
+        return Inode(number,
+                     self.readBlock(block)[offset:offset + self.inode_size])
+
+    def writeInode(self, inode):
+        block, offset = self._inodeLocation(inode.number)
+        self.modifyBlock(block)[offset:offset + self.inode_size] = inode.data
+
+    def newInode(self, mode, directory = False):
+        now = int(time.time())
+        inode = Inode(self.allocInode(directory), bytes(self.inode_size))
+        inode["mode"] = mode
+        inode["atime"] = inode["ctime"] = inode["mtime"] = now
+        inode["links_count"] = 1
+        return inode
+
+    def fileBlocks(self, inode):
+        """
+        Returns the data blocks (0 for holes) and the indirect blocks of
+        the given inode.
+        """
+        if inode.isFastSymlink():
+            return [], []
+        bs = self.block_size
+        per_block = bs // 4
+        count = math.ceil(inode.fileSize() / bs)
+        data, meta = [], []
+
+        def walk(pointer, depth):
+            if len(data) >= count:
+                return
+            if pointer == 0:
+                data.extend([0] * min(per_block ** depth, count - len(data)))
+            elif depth == 0:
+                data.append(pointer)
+            else:
+                meta.append(pointer)
+                for child in struct.unpack("<{}I".format(per_block),
+                                           self.readBlock(pointer)):
+                    walk(child, depth - 1)
+
+        pointers = inode.block
+        for pointer in pointers[:12]:
+            walk(pointer, 0)
+        for depth, pointer in enumerate(pointers[12:], 1):
+            walk(pointer, depth)
+        return data, meta
+
+    def setFileBlocks(self, inode, data):
+        """
+        Points the inode to the given data blocks, allocating the needed
+        indirect blocks.
+        """
+        per_block = self.block_size // 4
+        pointers = data[:12] + [0] * (15 - len(data[:12]))
+        meta = []
+
+        def build(blocks, depth):
+            # Returns the indirect block of the given depth for blocks
+            block, = self.allocBlocks(1)
+            meta.append(block)
+            span = per_block ** (depth - 1)
+            if depth == 1:
+                children = blocks
+            else:
+                children = [build(blocks[i:i + span], depth - 1)
+                            for i in range(0, len(blocks), span)]
+            self.modifyBlock(block)[:] = struct.pack("<{}I".format(
+                per_block), *(children + [0] * (per_block - len(children))))
+            return block
+
+        rest = data[12:]
+        for depth in range(1, 4):
+            if not rest:
+                break
+            span = per_block ** depth
+            pointers[11 + depth] = build(rest[:span], depth)
+            rest = rest[span:]
+        if rest:
+            raise Ext2Error("File too large")
+
+        inode.block = pointers
+        inode["blocks"] = (len(data) + len(meta)) * (self.block_size // 512)
+
+    def writeFile(self, inode, data):
+        """ Replaces the content of the given inode with data """
+        old_data, old_meta = self.fileBlocks(inode)
+        self.freeBlocks([block for block in old_data if block])
+        self.freeBlocks(old_meta)
+
+        if stat.S_ISLNK(inode["mode"]) and len(data) < 60:
+            # Fast symlink, the target is kept in the block pointers
+            inode.data[40:100] = data.ljust(60, b"\0")
+            inode["blocks"] = 0
+        else:
+            blocks = self.allocBlocks(math.ceil(len(data) / self.block_size))
+            self.writeData(blocks, data)
+            self.setFileBlocks(inode, blocks)
+        inode.setFileSize(len(data))
+        inode["mtime"] = inode["ctime"] = int(time.time())
+        self.writeInode(inode)
+
+    def readFile(self, inode):
+        if inode.isFastSymlink():
+            return bytes(inode.data[40:40 + inode.fileSize()])
+        blocks, _ = self.fileBlocks(inode)
+        data = b"".join(bytes(self.readBlock(block)) if block
+                        else bytes(self.block_size) for block in blocks)
+        return data[:inode.fileSize()]
+
+    # Directories
+
+    def entries(self, directory):
+        """
+        Yields (block, offset, inode, rec_len, name) for the entries of
+        the given directory inode.
+        """
+        blocks, _ = self.fileBlocks(directory)
+        for block in blocks:
+            data = self.readBlock(block)
+            offset = 0
+            while offset < self.block_size:
+                ino, rec_len, name_len = struct.unpack_from("<IHB", data,
+                                                            offset)
+                if rec_len == 0:
+                    raise Ext2Error("Corrupted directory {}".format(
+                                    directory.number))
+                name = bytes(data[offset + 8:offset + 8 + name_len])
+                yield block, offset, ino, rec_len, name
+                offset += rec_len
+
+    def findEntry(self, directory, name):
+        """ Returns the inode number of name in directory or None """
+        for _, _, ino, _, entry in self.entries(directory):
+            if ino and entry == name.encode():
+                return ino
+        return None
+
+    def lookup(self, path):
+        """ Returns the inode number of path or None """
+        number = ROOT_INO
+        for name in path.strip("/").split("/"):
+            if not name:
+                continue
+            directory = self.readInode(number)
+            if not stat.S_ISDIR(directory["mode"]):
+                return None
+            number = self.findEntry(directory, name)
+            if number is None:
+                return None
+        return number
+
+    def _entry(self, ino, name, mode, rec_len):
+        entry = struct.pack("<IHBB", ino, rec_len, len(name),
+                            FILE_TYPES[stat.S_IFMT(mode)]
+                            if self.filetype else 0) + name
+        return entry.ljust(rec_len, b"\0")
+
+    def addEntry(self, directory, name, inode):
+        """ Adds an entry for inode in the given directory inode """
+        name = name.encode()
+        needed = (8 + len(name) + 3) & ~3
+        for block, offset, ino, rec_len, entry in self.entries(directory):
+            used = (8 + len(entry) + 3) & ~3 if ino else 0
+            if rec_len - used >= needed:
+                data = self.modifyBlock(block)
+                if ino:
+                    struct.pack_into("<H", data, offset + 4, used)
+                data[offset + used:offset + rec_len] = self._entry(
+                    inode.number, name, inode["mode"], rec_len - used)
+                break
+        else:
+            # No room left, add a block to the directory
+            blocks, meta = self.fileBlocks(directory)
+            block, = self.allocBlocks(1)
+            self.modifyBlock(block)[:] = self._entry(inode.number, name,
+                inode["mode"], self.block_size)
+            self.freeBlocks(meta)
+            self.setFileBlocks(directory, blocks + [block])
+            directory.setFileSize(directory.fileSize() + self.block_size)
+
+        # The htree index would be stale, fall back to a linear directory
+        directory["flags"] &= ~INDEX_FL
+        directory["mtime"] = directory["ctime"] = int(time.time())
+        self.writeInode(directory)
+
+    def makeDirectory(self, parent, name, mode = 0o755, number = None):
+        """ Creates a directory in parent, returns its inode """
+        if number is None:
+            inode = self.newInode(stat.S_IFDIR | mode, directory = True)
+        else:
+            inode = Inode(number, bytes(self.inode_size))
+            inode["mode"] = stat.S_IFDIR | mode
+            inode["atime"] = inode["ctime"] = inode["mtime"] = \
+                int(time.time())
+        inode["links_count"] = 2
+        if parent is None:
+            parent = inode
+
+        block, = self.allocBlocks(1)
+        dot = self._entry(inode.number, b".", inode["mode"], 12)
+        dotdot = self._entry(parent.number, b"..", parent["mode"],
+                             self.block_size - 12)
+        self.modifyBlock(block)[:] = dot + dotdot
+        self.setFileBlocks(inode, [block])
+        inode.setFileSize(self.block_size)
+        self.writeInode(inode)
+
+        if parent is not inode:
+            self.addEntry(parent, name, inode)
+            parent["links_count"] += 1
+            self.writeInode(parent)
+        return inode
+
+    def makeDirectories(self, path):
+        """ Creates path and its missing parents, returns its inode """
+        directory = self.readInode(ROOT_INO)
+        for name in path.strip("/").split("/"):
+            if not name:
+                continue
+            number = self.findEntry(directory, name)
+            if number is None:
+                directory = self.makeDirectory(directory, name)
+            else:
+                directory = self.readInode(number)
+                if not stat.S_ISDIR(directory["mode"]):
+                    raise Ext2Error("{} is not a directory".format(name))
+        return directory
+
+    # Files
+
+    def putFile(self, path, data, mode):
+        """
+        Creates or replaces the file (or symbolic link) at path with the
+        given content and mode.
+        """
+        parent_path, name = os.path.split("/" + path.strip("/"))
+        parent = self.makeDirectories(parent_path)
+        number = self.findEntry(parent, name)
+        if number is None:
+            inode = self.newInode(mode)
+            self.writeFile(inode, data)
+            self.addEntry(parent, name, inode)
+            return inode
+
+        inode = self.readInode(number)
+        if stat.S_IFMT(inode["mode"]) != stat.S_IFMT(mode):
+            raise Ext2Error("Cannot replace {} with a different type of "
+                            "file".format(path))
+        inode["mode"] = mode
+        self.writeFile(inode, data)
+        return inode
+
+    def putTree(self, source, path):
+        """
+        Copies the host file or directory tree at source to path in the
+        image. Special files (devices, fifos, sockets) are skipped.
+        """
+        info = os.lstat(source)
+        if stat.S_ISDIR(info.st_mode):
+            directory = self.makeDirectories(path)
+            directory["mode"] = stat.S_IFDIR | stat.S_IMODE(info.st_mode)
+            self.writeInode(directory)
+            for name in sorted(os.listdir(source)):
+                self.putTree(os.path.join(source, name),
+                             path.rstrip("/") + "/" + name)
+        elif stat.S_ISLNK(info.st_mode):
+            self.putFile(path, os.readlink(source).encode(),
+                         stat.S_IFLNK | 0o777)
+        elif stat.S_ISREG(info.st_mode):
+            with open(source, "rb") as data:
+                self.putFile(path, data.read(),
+                             stat.S_IFREG | stat.S_IMODE(info.st_mode))
+        else:
+            print("Skipping special file {}".format(source),
+                  file = sys.stderr)
+
+def hasSuperblockBackup(group):
+    """ Groups with a superblock copy with the sparse_super feature """
+    if group <= 1:
+        return True
+    for base in (3, 5, 7):
+        power = base
+        while power < group:
+            power *= base
+        if power == group:
+            return True
+    return False
+
+def createImage(file_name, size, block_size = 4096, bytes_per_inode = 16384,
+                label = ""):
+    """
+    Creates an empty ext2 file system of the given size (in bytes) in
+    file_name and returns it opened as an Ext2Image.
+    """
+    first_data_block = 1 if block_size == 1024 else 0
+    blocks_count = size // block_size
+    bpg = 8 * block_size
+    num_groups = math.ceil((blocks_count - first_data_block) / bpg)
+
+    # Inode tables fill whole blocks
+    inodes_per_block = block_size // INODE_SIZE
+    ipg = math.ceil(size // bytes_per_inode / num_groups / inodes_per_block)
+    ipg = min(max(ipg, 1) * inodes_per_block, bpg)
+    itb = ipg // inodes_per_block
+    gdt_blocks = math.ceil(num_groups * GROUP_DESC_SIZE / block_size)
+
+    with open(file_name, "wb") as image:
+        image.truncate(blocks_count * block_size)
+
+    device = ImageFile(file_name)
+
+    sb = Struct(bytes(SUPERBLOCK_SIZE), SUPERBLOCK_FIELDS)
+    sb["inodes_count"] = ipg * num_groups
+    sb["blocks_count"] = blocks_count
+    sb["first_data_block"] = first_data_block
+    sb["log_block_size"] = sb["log_frag_size"] = block_size.bit_length() - 11
+    sb["blocks_per_group"] = sb["frags_per_group"] = bpg
+    sb["inodes_per_group"] = ipg
+    sb["max_mnt_count"] = -1
+    sb["magic"] = EXT2_MAGIC
+    sb["state"] = 1
+    sb["errors"] = 1
+    sb["lastcheck"] = int(time.time())
+    sb["rev_level"] = 1
+    sb["first_ino"] = FIRST_INO
+    sb["inode_size"] = INODE_SIZE
+    sb["feature_incompat"] = INCOMPAT_FILETYPE
+    sb["feature_ro_compat"] = RO_COMPAT_SPARSE_SUPER | RO_COMPAT_LARGE_FILE
+    sb["uuid"] = uuid.uuid4().bytes
+    sb["volume_name"] = label.encode()[:16]
+
+    groups = []
+    free_blocks = 0
+    for group in range(num_groups):
+        start = first_data_block + group * bpg
+        count = min(bpg, blocks_count - start)
+        used = (1 + gdt_blocks) if hasSuperblockBackup(group) else 0
+        block_bitmap = start + used
+        inode_bitmap = block_bitmap + 1
+        inode_table = inode_bitmap + 1
+        used += 2 + itb
+        if used >= count:
+            raise Ext2Error("Image too small")
+
+        # Metadata blocks and the bits past the end of the last group
+        bitmap = bytearray(block_size)
+        for index in list(range(used)) + list(range(count, bpg)):
+            bitmap[index // 8] |= 1 << index % 8
+        device.write(block_bitmap * block_size, bytes(bitmap))
+
+        bitmap = bytearray(block_size)
+        for index in range(ipg, 8 * block_size):
+            bitmap[index // 8] |= 1 << index % 8
+        if group == 0:
+            # Reserved inodes
+            for index in range(FIRST_INO - 1):
+                bitmap[index // 8] |= 1 << index % 8
+        device.write(inode_bitmap * block_size, bytes(bitmap))
+
+        free_inodes = ipg - (FIRST_INO - 1 if group == 0 else 0)
+        groups.append([block_bitmap, inode_bitmap, inode_table,
+                       count - used, free_inodes, 0])
+        free_blocks += count - used
+
+    sb["free_blocks_count"] = free_blocks
+    sb["free_inodes_count"] = ipg * num_groups - (FIRST_INO - 1)
+
+    # Superblock and group descriptor backups
+    gdt = bytearray(gdt_blocks * block_size)
+    for i, group in enumerate(groups):
+        struct.pack_into("<IIIHHH", gdt, i * GROUP_DESC_SIZE, *group)
+    for group in range(1, num_groups):
+        if hasSuperblockBackup(group):
+            start = first_data_block + group * bpg
+            sb["block_group_nr"] = group
+            device.write(start * block_size, bytes(sb.data).ljust(
+                         block_size, b"\0"))
+            device.write((start + 1) * block_size, bytes(gdt))
+    sb["block_group_nr"] = 0
+    device.write(SUPERBLOCK_OFFSET, bytes(sb.data))
+    device.write((first_data_block + 1) * block_size, bytes(gdt))
+
+    fs = Ext2Image(device)
+    root = fs.makeDirectory(None, "", number = ROOT_INO)
+    fs.groups[0][5] += 1
+    fs.makeDirectory(root, "lost+found", mode = 0o700)
+    return fs
+
+def parseSize(value):
+    units = {"": 0, "K": 10, "M": 20, "G": 30}
+    value = value.upper().rstrip("B").rstrip("I")
+    if value[-1:] in units:
+        return int(value[:-1]) << units[value[-1]]
+    return int(value)
+
+def main():
+    parser = argparse.ArgumentParser(description='Creates and patches ext2 '
+                'disk images without root.')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Create an image "
+                        "from a directory tree")
+    create_parser.add_argument("image")
+    create_parser.add_argument("directory")
+    create_parser.add_argument("--size", required=True,
+                               help="Size of the image (e.g., 512MB)")
+    create_parser.add_argument("--block-size", type=int, default=4096,
+                               choices=[1024, 2048, 4096])
+    create_parser.add_argument("--label", default="riscv-rootfs")
+
+    put_parser = subparsers.add_parser("put", help="Add or replace a file "
+                     "or directory tree in an image")
+    put_parser.add_argument("image")
+    put_parser.add_argument("source", help="Host file or directory")
+    put_parser.add_argument("path", help="Destination in the image")
+    put_parser.add_argument("--overlay", help="Write the changes to this "
+                            "gem5 copy-on-write overlay instead of the "
+                            "image. An existing overlay is updated")
+
+    ls_parser = subparsers.add_parser("ls", help="List a directory")
+    ls_parser.add_argument("image")
+    ls_parser.add_argument("path", nargs="?", default="/")
+    ls_parser.add_argument("--overlay")
+
+    cat_parser = subparsers.add_parser("cat", help="Print a file")
+    cat_parser.add_argument("image")
+    cat_parser.add_argument("path")
+    cat_parser.add_argument("--overlay")
+
+    args = parser.parse_args()
+
+    if args.command == "create":
+        fs = createImage(args.image, parseSize(args.size), args.block_size,
+                         label = args.label)
+        fs.putTree(args.directory, "/")
+        fs.close()
+        return
+
+    if args.overlay:
+        initial = args.overlay if os.path.exists(args.overlay) else None
+        device = OverlayImage(args.image, args.overlay, initial)
+    else:
+        device = ImageFile(args.image)
+    fs = Ext2Image(device)
+
+    if args.command == "put":
+        fs.putTree(args.source, args.path)
+        fs.close()
+        return
+
+    number = fs.lookup(args.path)
+    if number is None:
+        sys.exit("{}: not found".format(args.path))
+    inode = fs.readInode(number)
+    if args.command == "ls":
+        for _, _, ino, _, name in fs.entries(inode):
+            if ino:
+                entry = fs.readInode(ino)
+                print("{:o} {:>10} {}".format(entry["mode"],
+                      entry.fileSize(), name.decode()))
+    elif args.command == "cat":
+        sys.stdout.buffer.write(fs.readFile(inode))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Enclave interference study.
+
+Runs each enclave benchmark with run_trusted.py on one hart, alone and
+with every noise workload (an rv8 benchmark run natively in a loop) on
+an increasing number of the other harts, through the sweep launcher.
+Reports the time of the enclave in each run and its slowdown against
+the run without noise.
+
+    python3 interference.py [study directory] --gem5 gem5.opt \\
+        --sbi fw_payload.elf --disk rootfs.ext2 --cpu-type o3 \\
+        --num-cpus 4 --benchmarks aes --noise qsort,primes \\
+        --intensities 1,2,3
+"""
+
+import argparse
+import json
+import os
+import shlex
+
+from stats_file import readJson
+from sweep import Sweep
+
+def runName(bench, noise, harts):
+    if not harts:
+        return "{}-isolated".format(bench)
+    return "{}-{}-{}".format(bench, noise, harts)
+
+class InterferenceStudy(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.dir = os.path.abspath(args.dir)
+        os.makedirs(self.dir, exist_ok = True)
+        self.benchmarks = args.benchmarks.split(",")
+        self.noises = args.noise.split(",")
+        self.intensities = [int(harts)
+                            for harts in args.intensities.split(",")]
+
+    def points(self):
+        """ Returns the (noise, noise harts) points of bench """
+        # The isolated run has no noise harts, the noise is not started
+        return [(self.noises[0], 0)] + [(noise, harts)
+                for noise in self.noises for harts in self.intensities]
+
+    def run(self):
+        jobs_file = os.path.join(self.dir, "jobs.txt")
+        with open(jobs_file, "w") as jobs:
+            for bench in self.benchmarks:
+                for noise, harts in self.points():
+                    args = ["--noise", noise, "--noise-harts", str(harts),
+                            "--enclave-hart", str(self.args.enclave_hart),
+                            *shlex.split(self.args.options),
+                            self.args.sbi, self.args.disk,
+                            self.args.cpu_type, str(self.args.num_cpus),
+                            bench]
+                    jobs.write("{} run_trusted.py {}\n".format(
+                               runName(bench, noise, harts),
+                               " ".join(shlex.quote(arg) for arg in args)))
+
+        Sweep(argparse.Namespace(dir = self.dir, jobs = jobs_file,
+              gem5 = self.args.gem5, parallel = self.args.parallel,
+              max_memory = self.args.max_memory, ckpt_interval = 0,
+              results_store = self.args.results_store,
+              retry_failed = False)).run()
+
+    def report(self):
+        results = []
+        for bench in self.benchmarks:
+            isolated = readJson(os.path.join(self.dir,
+                                runName(bench, None, 0)), "interference.json")
+            for noise, harts in self.points():
+                run = readJson(os.path.join(self.dir,
+                               runName(bench, noise, harts)),
+                               "interference.json")
+                if not run:
+                    results.append({"bench": bench, "noise": noise,
+                                    "noise_harts": harts, "failed": True})
+                    continue
+                seconds = run["enclave_sim_seconds"]
+                results.append({
+                    "bench": bench,
+                    "noise": noise if harts else None,
+                    "noise_harts": harts,
+                    "enclave_sim_seconds": seconds,
+                    "slowdown": seconds / isolated["enclave_sim_seconds"]
+                                if isolated and
+                                   isolated["enclave_sim_seconds"] else None,
+                    "enclave_ipc": run["enclave"]["ipc"],
+                    "enclave_dcache_miss_rate":
+                        run["enclave"]["dcache_miss_rate"],
+                    "noise_ipc": sum(hart["ipc"] or 0 for hart in
+                                     run["noise_harts"].values()),
+                })
+
+        with open(os.path.join(self.dir, "interference_report.json"),
+                  "w") as out:
+            json.dump(results, out, indent=4)
+
+        print("{:<10} {:<10} {:>6} {:>12} {:>9} {:>8} {:>10}".format(
+              "bench", "noise", "harts", "enclave", "slowdown", "IPC",
+              "noise IPC"))
+        for result in results:
+            if result.get("failed"):
+                print("{:<10} {:<10} {:>6} failed".format(result["bench"],
+                      result["noise"], result["noise_harts"]))
+                continue
+            print("{:<10} {:<10} {:>6} {:>11.6f}s {:>9} {:>8} "
+                  "{:>10.3f}".format(result["bench"],
+                  result["noise"] or "-", result["noise_harts"],
+                  result["enclave_sim_seconds"],
+                  "{:.3f}x".format(result["slowdown"])
+                  if result["slowdown"] else "-",
+                  "{:.3f}".format(result["enclave_ipc"])
+                  if result["enclave_ipc"] else "-",
+                  result["noise_ipc"]))
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the slowdown '
+                'of enclaves running next to untrusted noise.')
+    parser.add_argument("dir", help="Study directory (sweep journal and "
+                        "output directories)")
+    parser.add_argument("--gem5", required=True,
+                        help="Path to the gem5 binary")
+    parser.add_argument("--sbi", required=True, help="Path to the opensbi "
+                        "binary with kernel payload")
+    parser.add_argument("--disk", required=True,
+                        help="Path to the disk image")
+    parser.add_argument("--cpu-type", default="o3",
+                        help="CPU type of the runs (default: %(default)s)")
+    parser.add_argument("--num-cpus", type=int, default=4,
+                        help="Harts of the system (default: %(default)s)")
+    parser.add_argument("--benchmarks", default="aes",
+                        help="Comma separated enclave benchmarks "
+                        "(default: %(default)s)")
+    parser.add_argument("--noise", default="qsort,primes",
+                        help="Comma separated noise benchmarks "
+                        "(default: %(default)s)")
+    parser.add_argument("--intensities", default="1,2,3",
+                        help="Comma separated numbers of noise harts "
+                        "(default: %(default)s)")
+    parser.add_argument("--enclave-hart", type=int, default=0,
+                        help="Hart of the enclave (default: %(default)s)")
+    parser.add_argument("--options", default="",
+                        help="Other run script options, e.g., "
+                        "\"--ckpt-library library\"")
+    parser.add_argument("--parallel", type=int, default=os.cpu_count(),
+                        help="Maximum number of jobs running at once")
+    parser.add_argument("--max-memory", help="Host memory for the jobs "
+                        "(see sweep.py)")
+    parser.add_argument("--results-store", help="Results store passed to "
+                        "the jobs")
+    parser.add_argument("--report-only", action="store_true",
+                        help="Report the finished runs without running")
+    args = parser.parse_args()
+
+    study = InterferenceStudy(args)
+    if not args.report_only:
+        study.run()
+    study.report()
+
+if __name__ == "__main__":
+    main()
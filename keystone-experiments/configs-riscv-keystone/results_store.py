@@ -0,0 +1,216 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+A local store of finished runs.
+
+Each run is keyed by a hash of everything that determines its result:
+the content of the gem5 binary, of the bootloader, of the disk images
+and of the guest script, the command line options and the config.ini of
+the simulated system. The run scripts (--results-store) look the key up
+before simulating. On a match, the stored stats and exit status are
+copied to the output directory and the run exits right away, so
+re-running a sweep only simulates the missing points.
+
+    python3 results_store.py [store directory] list
+    python3 results_store.py [store directory] remove [key]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from ckpt_library import FileHashes
+
+# Files of an output directory not kept for a finished run (in addition
+# to the checkpoint directories and the disk overlay of the run)
+EXCLUDED_SUFFIXES = [".cow"]
+
+# Options that do not change the result of a run
+IGNORED_OPTIONS = ["dry_run", "ckpt_library", "ckpt_library_size",
+                   "share_memory", "disk_overlay", "profile",
+                   "profile_python", "profile_sampler", "results_store"]
+
+def writeResult(outdir, exit_cause, exit_code, **extra):
+    """ Writes the outcome of a run to result.json in outdir """
+    result = {"exit_cause": exit_cause, "exit_code": exit_code}
+    result.update(extra)
+    with open(os.path.join(outdir, "result.json"), "w") as out:
+        json.dump(result, out, indent=4)
+
+class ResultsStore(object):
+
+    def __init__(self, dir):
+        self.dir = os.path.abspath(dir)
+        self.store = os.path.join(self.dir, "results")
+        os.makedirs(self.store, exist_ok = True)
+
+        # Parallel jobs of a sweep share the store
+        self.db = sqlite3.connect(os.path.join(self.dir, "index.sqlite"),
+                                  timeout = 600)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            dir TEXT NOT NULL,
+            exit_cause TEXT NOT NULL,
+            exit_code INTEGER NOT NULL,
+            created REAL NOT NULL,
+            config TEXT NOT NULL)''')
+        self.db.commit()
+        self.file_hashes = FileHashes(self.db)
+
+    def runKey(self, options, files, outdir):
+        """
+        Returns the key and the description of a run from its command
+        line options (a dictionary), its input files (name -> path,
+        identified by their content) and the config.ini in outdir.
+        Paths to the output directory in config.ini are ignored, however
+        the output directory is spelled (e.g., m5out or its absolute
+        path).
+        """
+        files = {name: file_name for name, file_name in files.items()
+                 if file_name and os.path.isfile(file_name)}
+        # The simulator itself
+        if os.path.exists("/proc/self/exe"):
+            files["gem5"] = os.path.realpath("/proc/self/exe")
+
+        params = {name: value for name, value in options.items()
+                  if name not in files and name not in IGNORED_OPTIONS}
+
+        with open(os.path.join(outdir, "config.ini")) as ini:
+            config_ini = ini.read()
+        # Paths start a value (or an item of a list of values)
+        for spelling in {os.path.abspath(outdir), outdir,
+                         os.path.normpath(outdir)}:
+            config_ini = re.sub(r"(?<=[=\s]){}(?=/)".format(
+                re.escape(spelling.rstrip("/"))), "$OUTDIR", config_ini)
+        params["config_ini"] = hashlib.sha256(
+            config_ini.encode()).hexdigest()
+
+        return self.file_hashes.key(files, **params)
+
+    def lookup(self, key):
+        """
+        Returns the directory, the exit cause and the exit code of the
+        successful run with the given key or None if there is no such
+        run.
+        """
+        row = self.db.execute('''SELECT dir, exit_cause, exit_code
+            FROM results WHERE key = ? AND exit_code = 0''',
+            (key,)).fetchone()
+        if not row or not os.path.isdir(row[0]):
+            return None
+        return row
+
+    def checkout(self, key, out_dir):
+        """
+        Copies the stored files of the run with the given key to
+        out_dir. Returns the exit cause and the exit code of the run or
+        None if there is no such run.
+        """
+        row = self.lookup(key)
+        if not row:
+            return None
+        dir, exit_cause, exit_code = row
+        for name in os.listdir(dir):
+            shutil.copyfile(os.path.join(dir, name),
+                            os.path.join(out_dir, name))
+        return exit_cause, exit_code
+
+    def add(self, key, config, out_dir, exit_cause, exit_code,
+            exclude = []):
+        """
+        Keeps the files in out_dir (stats, reports, console output, but
+        not the checkpoint directories, disk overlays and the files in
+        exclude) for the run with the given key and description.
+        Returns the directory of the run in the store.
+        """
+        exclude = [os.path.realpath(file_name) for file_name in exclude
+                   if file_name]
+        dir = tempfile.mkdtemp(prefix = "new-", dir = self.store)
+        for name in os.listdir(out_dir):
+            file_name = os.path.join(out_dir, name)
+            if not os.path.isfile(file_name) or \
+               os.path.realpath(file_name) in exclude or \
+               name.endswith(tuple(EXCLUDED_SUFFIXES)):
+                continue
+            shutil.copyfile(file_name, os.path.join(dir, name))
+
+        # Another job may have stored the same run in the meantime
+        final_dir = os.path.join(self.store, key)
+        shutil.rmtree(final_dir, ignore_errors = True)
+        os.rename(dir, final_dir)
+
+        self.db.execute("INSERT OR REPLACE INTO results VALUES "
+                        "(?, ?, ?, ?, ?, ?)", (key, final_dir, exit_cause,
+                        exit_code, time.time(), config))
+        self.db.commit()
+        return final_dir
+
+    def remove(self, key):
+        # Also the failed runs kept by older versions
+        row = self.db.execute("SELECT dir FROM results WHERE key = ?",
+                              (key,)).fetchone()
+        if row:
+            shutil.rmtree(row[0], ignore_errors = True)
+        self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+        self.db.commit()
+
+    def results(self):
+        """ Returns all stored runs, most recent first """
+        return self.db.execute('''SELECT key, dir, exit_cause, exit_code,
+            created, config FROM results ORDER BY created DESC''').fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description='Manages a local store '
+                'of finished gem5 runs.')
+    parser.add_argument("store", help="Path to the store directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the stored runs")
+    remove_parser = subparsers.add_parser("remove", help="Remove a run")
+    remove_parser.add_argument("key", help="Key of the run")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+
+    if args.command == "list":
+        for key, dir, exit_cause, exit_code, created, config in \
+                store.results():
+            print("{} exit {} ({}) {}".format(key[:16], exit_code,
+                  exit_cause, time.strftime("%Y-%m-%d %H:%M",
+                  time.localtime(created))))
+            print("    {}".format(config))
+    elif args.command == "remove":
+        store.remove(args.key)
+
+if __name__ == "__main__":
+    main()
@@ -31,12 +31,17 @@ This script is supposed to run keystone benchmarks
 
 import time
 import argparse
+import shutil
+from os import path
 
 import m5
 import m5.ticks
 from m5.objects import *
 
 from system import *
+from ckpt_library import CheckpointLibrary, CHECKPOINT_CAUSE, parseSize, \
+                         writeCheckpointHook
+from results_store import ResultsStore, writeResult
 
 def parse_options():
     parser = argparse.ArgumentParser(description='Runs Linux boot test with'
@@ -48,74 +53,439 @@ def parse_options():
     parser.add_argument("cpu_type", help="The type of CPU in the system")
     parser.add_argument("num_cpus", type=int, help="Number of CPU cores")
     parser.add_argument("bench", help="Benchmark to simulate")
+    parser.add_argument("--cpu-preset", choices=sorted(CPU_PRESETS),
+                        help="Model a real core with the minor (u54, u74) "
+                        "or o3 (boom-*) CPU type")
+    parser.add_argument("--cores", help="Heterogeneous cores as comma "
+                        "separated COUNTxTYPE[:L1SIZE] groups of CPU types "
+                        "or presets (e.g., 1xminor:16kB,4xo3). Replaces "
+                        "cpu_type, the counts must add up to num_cpus")
+    parser.add_argument("--mem-size", help="Memory size (default: 1GB, "
+                        "64MB per hart beyond 16 harts)")
+    parser.add_argument("--mem-channels", type=int, help="Memory "
+                        "channels, interleaved on cache lines (default: "
+                        "one per 8 harts, up to 8)")
+    parser.add_argument("--cluster-size", type=int, default=8,
+                        help="Harts per cluster crossbar, 0 connects all "
+                        "the harts to the memory bus (default: "
+                        "%(default)s)")
+    parser.add_argument("--pin-harts", help="Run the benchmark on these "
+                        "harts only (taskset CPU list, e.g., 0 or 1-4)")
+    parser.add_argument("--mix", help="Multi-programmed workload of "
+                        "comma separated benchmark:hart pairs (e.g., "
+                        "aes:0,sha512:1). bench only names the run")
+    parser.add_argument("--mix-isolated", action="append", default=[],
+                        help="Output directory of a single benchmark mix "
+                        "run, for the speedups of --mix (repeatable)")
+    parser.add_argument("--bpred", choices=sorted(BRANCH_PREDICTORS),
+                        help="Branch predictor of the minor and o3 CPUs "
+                        "(default: the gem5 default, tournament)")
+    parser.add_argument("--cpu-param", action="append", default=[],
+                        help="Set a CPU parameter (name=value, e.g., "
+                        "numROBEntries=64), repeatable")
+    parser.add_argument("--l1-latency", type=int,
+                        help="Tag, data and response latency of the L1 "
+                        "caches in cycles (default: 1)")
+    parser.add_argument("--dram", help="gem5 DRAM interface of the "
+                        "memory (default: DDR3_1600_8x8)")
+    parser.add_argument("--itlb-entries", type=int,
+                        help="Entries of the instruction TLBs (default: 64)")
+    parser.add_argument("--dtlb-entries", type=int,
+                        help="Entries of the data TLBs (default: 64)")
+    parser.add_argument("--walker-cache", default="32kB",
+                        help="Size of the page table walker caches or none "
+                        "(default: %(default)s)")
+    parser.add_argument("--walker-cache-mshrs", type=int,
+                        help="Page table accesses in flight per walker "
+                        "cache (default: 16)")
+    parser.add_argument("--walker-monitor", action="store_true",
+                        help="Record a latency histogram of the page "
+                        "table accesses")
+    parser.add_argument("--cpu-clock", help="Clock of the CPU cluster "
+                        "(default: 3GHz)")
+    parser.add_argument("--cpu-voltage", help="Voltage of the CPU cluster "
+                        "(default: 1V)")
+    parser.add_argument("--uncore-clock", help="Clock of the crossbars, "
+                        "the memory controller and the devices "
+                        "(default: 3GHz)")
+    parser.add_argument("--uncore-voltage", help="Voltage of the uncore "
+                        "(default: 1V)")
+    parser.add_argument("--dvfs-opps", help="Operating points of the CPU "
+                        "cluster for the DVFS handler, comma separated "
+                        "clock:voltage pairs (e.g., 3GHz:1.0V,1GHz:0.8V)")
+    parser.add_argument("--dvfs-level", type=int, default=0,
+                        help="Initial operating point, 0 is the fastest")
+    parser.add_argument("--power", action="store_true",
+                        help="Add power models and report the average "
+                        "power and the energy of the measured region")
+    parser.add_argument("--vmlinux", help="Path to the vmlinux of the "
+                        "kernel payload. Enables the boot phase timeline "
+                        "based on PC events on kernel functions")
+    parser.add_argument("--boot-events",
+                        default=",".join(DEFAULT_BOOT_EVENTS),
+                        help="Comma separated kernel functions marking "
+                        "the boot phases (default: %(default)s)")
+    parser.add_argument("--boot-phase-stats", action="store_true",
+                        help="Dump the stats at the end of each boot phase")
+    parser.add_argument("--warmup-insts", type=int, default=0,
+                        help="Instructions to warm up for after the start "
+                        "marker before measuring (with --roi-insts)")
+    parser.add_argument("--roi-insts", type=int, default=0,
+                        help="Measure exactly this many instructions after "
+                        "the start marker instead of running up to the "
+                        "end marker")
+    parser.add_argument("--boot-only", action="store_true",
+                        help="Exit at the start marker after the boot")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Validate the configuration, write config.ini, "
+                        "config.json, the DTB and a host memory estimate "
+                        "and exit without simulating")
+    parser.add_argument("--ckpt-library", help="Path to a checkpoint "
+                        "library. A matching post-boot checkpoint is "
+                        "restored or created if there is none")
+    parser.add_argument("--ckpt-library-size",
+                        help="Maximum size of the checkpoint library "
+                        "(e.g., 50GB). Least recently used checkpoints "
+                        "are removed beyond it")
+    parser.add_argument("--share-memory", action="store_true",
+                        help="Let the host kernel (KSM) share identical "
+                        "pages of the simulated memory with other jobs, "
+                        "e.g., jobs restored from the same checkpoint")
+    parser.add_argument("--disk-overlay", help="File to keep the "
+                        "copy-on-write layer of the disk in. An existing "
+                        "file is used as the initial layer")
+    parser.add_argument("--disk-overlay-base", help="Overlay to start "
+                        "from. It is copied to the --disk-overlay file "
+                        "(default: disk.cow in the output directory)")
+    parser.add_argument("--payload-disk", help="Image with the rv8-bench "
+                        "directory to attach as a second disk. The "
+                        "benchmark is run from it instead of the root disk")
+    parser.add_argument("--parallel-eventqs", action="store_true",
+                        help="Simulate each CPU and its private caches on "
+                        "its own event queue (host thread). Experimental: "
+                        "the classic memory system is not thread safe, "
+                        "the run can crash and the results are not "
+                        "reliable")
+    parser.add_argument("--sim-quantum", default="1us",
+                        help="Synchronization quantum of the event queues "
+                        "with --parallel-eventqs (default: %(default)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a host time breakdown of the run "
+                        "phases to profile.json in the output directory")
+    parser.add_argument("--profile-python", action="store_true",
+                        help="Profile the Python phases with cProfile "
+                        "(with --profile)")
+    parser.add_argument("--profile-sampler", choices=sorted(SAMPLERS),
+                        help="Attach a sampling profiler to gem5 for the "
+                        "whole run (with --profile)")
+    parser.add_argument("--results-store", help="Path to a store of "
+                        "finished runs. If the same run is in the store, "
+                        "its stats and exit status are reused")
+    parser.add_argument("--ckpt-interval", type=int, default=0,
+                        help="Take a checkpoint every this many simulated "
+                        "ticks. A run in the same output directory "
+                        "resumes from the last one")
 
     return parser.parse_args()
 
-def writeBenchScript(dir, bench):
+def benchCommand(bench):
+    """ Returns the command line running bench in the guest """
+    return 'rv8-bench/riscv64/{}.O3'.format(bench)
+
+def writeBenchScript(dir, bench, payload = False, pin_harts = None,
+                     mix = None):
     """
     This method creates a script in dir which will be eventually
     passed to the simulated system (to run a specific benchmark
-    at bootup).
+    at bootup). If payload is set, the benchmarks are taken from
+    the second disk. If pin_harts is set, the benchmark only runs
+    on these harts. If mix is set, its benchmarks run on their harts
+    instead.
     """
     file_name = '{}/run_{}'.format(dir, bench)
     bench_file = open(file_name,"w+")
     bench_file.write('cd /root/ \n')
+    if payload:
+        bench_file.write('mount -o ro /dev/vdb /mnt \n')
+        bench_file.write('cd /mnt/ \n')
+    if mix:
+        writeMixCommands(bench_file, mix, benchCommand)
+        bench_file.close()
+        return file_name
     bench_file.write('/sbin/m5 exit \n')
-    bench_file.write('rv8-bench/riscv64/{}.O3 '.format(args.bench))
+    if pin_harts:
+        bench_file.write('taskset -c {} '.format(pin_harts))
+    bench_file.write(benchCommand(args.bench) + ' \n')
     bench_file.write('/sbin/m5 exit \n')
     bench_file.close()
     return file_name
 
+def finish(exit_cause, exit_code):
+    """
+    Writes the outcome of the run to result.json, keeps it in the
+    results store (with --results-store) and exits with exit_code.
+    """
+    if periodic:
+        periodic.finish()
+    writeResult(m5.options.outdir, exit_cause, exit_code,
+                key = results_key, sim_ticks = m5.curTick(),
+                host_seconds = time.time() - globalStart,
+                options = vars(args),
+                resumed_at = periodic.resumed_at if periodic else [])
+    # A failed run is simulated again the next time
+    if results and exit_code == 0:
+        results.add(results_key, results_config, m5.options.outdir,
+                    exit_cause, exit_code, exclude = [args.disk_overlay])
+    exit(exit_code)
 
 if __name__ == "__m5_main__":
 
     args = parse_options()
 
+    if args.profile:
+        HostProfiler(args.profile_python, args.profile_sampler)
+    startPhase("config")
+
+    # Start from a copy of the given overlay, so it can be shared
+    if args.disk_overlay_base and not args.dry_run:
+        if not args.disk_overlay:
+            args.disk_overlay = path.join(m5.options.outdir, 'disk.cow')
+        shutil.copyfile(args.disk_overlay_base, args.disk_overlay)
+
     # create the system we are going to simulate
 
-    system = RiscvSystem(args.sbi, args.disk, args.cpu_type, args.num_cpus)
+    cores = None
+    if args.cores:
+        if args.cpu_preset:
+            m5.fatal("Use the preset names in --cores instead of "
+                     "--cpu-preset")
+        cores = parseCores(args.cores)
+        if sum(count for count, _, _ in cores) != args.num_cpus:
+            m5.fatal("--cores {} does not have {} CPUs".format(args.cores,
+                     args.num_cpus))
+
+    system = RiscvSystem(args.sbi, args.disk, args.cpu_type, args.num_cpus,
+                         args.disk_overlay, args.payload_disk,
+                         args.cpu_preset, args.bpred, args.walker_cache,
+                         args.walker_monitor, cores, args.mem_size,
+                         args.mem_channels, args.cluster_size)
+    system.setClocks(args.cpu_clock, args.uncore_clock, args.cpu_voltage,
+                     args.uncore_voltage)
+    if args.dvfs_opps:
+        if args.cpu_clock or args.cpu_voltage:
+            m5.fatal("--dvfs-opps replaces --cpu-clock and --cpu-voltage")
+        system.enableDVFS([point.split(":")
+                           for point in args.dvfs_opps.split(",")],
+                          args.dvfs_level)
+    if args.dram:
+        system.setDRAM(args.dram)
+    if args.l1_latency:
+        system.setL1Latency(args.l1_latency)
+    system.setCpuParams(args.cpu_param)
+    system.setTLBSizes(args.itlb_entries, args.dtlb_entries)
+    if args.walker_cache_mshrs:
+        if args.walker_cache == "none":
+            m5.fatal("--walker-cache-mshrs needs a walker cache")
+        system.setWalkerCacheMSHRs(args.walker_cache_mshrs)
 
     # Exit from guest on workbegin/workend
     system.exit_on_work_items = True
 
     # Create and pass a script to the simulated system to run the reuired
     # benchmark
-    system.readfile = writeBenchScript(m5.options.outdir, args.bench)
+    mix = None
+    if args.mix:
+        if args.pin_harts:
+            m5.fatal("--pin-harts cannot be used with --mix")
+        mix = parseMix(args.mix, len(system.cpu))
+    system.readfile = writeBenchScript(m5.options.outdir, args.bench,
+                                       bool(args.payload_disk),
+                                       args.pin_harts, mix)
+
+    # Look for a post-boot checkpoint of this system in the library
+    ckpt_dir = None
+    restore_dir = path.join(m5.options.outdir, "restore.cpt")
+    if args.ckpt_library and not args.dry_run:
+        library = CheckpointLibrary(args.ckpt_library)
+        writeCheckpointHook(system.readfile)
+        ckpt_files = {
+            "sbi": args.sbi,
+            "disk": args.disk,
+            "dtb": path.join(m5.options.outdir, 'device.dtb')
+        }
+        # The disk overlay is restored from the checkpoint as well. Its
+        # initial layer is the --disk-overlay file (an existing one or
+        # the copy of --disk-overlay-base)
+        if args.disk_overlay and path.isfile(args.disk_overlay):
+            ckpt_files["disk_overlay"] = args.disk_overlay
+        ckpt_key, ckpt_config = library.key(ckpt_files,
+            num_cpus = args.num_cpus,
+            mem_size = sum(int(r.size()) for r in system.mem_ranges),
+            command_line = str(system.workload.command_line)
+        )
 
     # set up the root SimObject and start the simulation
     root = Root(full_system = True, system = system)
 
+    # The power expressions refer to the stats by their paths
+    if args.power:
+        if not system.hasDetailedCPUs(all_cpus = True):
+            m5.fatal("--power needs minor or o3 CPUs only")
+        addPowerModels(system)
+
+    # One host thread per CPU, the shared system stays on event queue 0
+    if args.parallel_eventqs:
+        system.assignEventQueues()
+        m5.ticks.fixGlobalFrequency()
+        root.sim_quantum = m5.ticks.fromSeconds(
+            m5.util.convert.anyToLatency(args.sim_quantum))
+        m5.util.warn("Parallel event queues: the classic memory system "
+                     "is called from several threads without "
+                     "synchronization, the run can crash or corrupt its "
+                     "state and the results (quantum {}) are not "
+                     "reliable".format(args.sim_quantum))
+
+    # Reuse the result of the same run if it is in the store
+    results = None
+    results_key = results_config = None
+    if args.results_store and not args.dry_run:
+        results = ResultsStore(args.results_store)
+        writeConfig(root)
+        results_key, results_config = results.runKey(vars(args), {
+            "sbi": args.sbi,
+            "disk": args.disk,
+            "vmlinux": args.vmlinux,
+            # gem5 writes the overlay back at exit, a copied base is
+            # identified by the base itself
+            "disk_overlay_base": args.disk_overlay_base,
+            "disk_overlay": None if args.disk_overlay_base
+                            else args.disk_overlay,
+            "payload_disk": args.payload_disk,
+            "guest_script": str(system.readfile)
+        }, m5.options.outdir)
+        stored = results.checkout(results_key, m5.options.outdir)
+        if stored:
+            print("Reusing the stored result of run {} ({})".format(
+                  results_key[:16], stored[0]))
+            exit(stored[1])
+
+    # Resume an interrupted run from its last periodic checkpoint
+    periodic = None
+    if args.ckpt_interval and not args.dry_run:
+        if args.roi_insts or args.vmlinux:
+            m5.fatal("--ckpt-interval cannot be used with --roi-insts "
+                     "or --vmlinux")
+        periodic = PeriodicCheckpoints(args.ckpt_interval)
+        ckpt_dir = periodic.resumeDirectory()
+        if ckpt_dir:
+            print("Resuming from {} ({})".format(ckpt_dir, periodic.phase))
+
+    if args.ckpt_library and not args.dry_run and not ckpt_dir:
+        ckpt_dir = library.checkout(ckpt_key, restore_dir)
+        if ckpt_dir:
+            print("Restoring checkpoint {}".format(ckpt_dir))
+
+    # Track the boot phases using PC events on the kernel functions
+    timeline = None
+    if args.vmlinux and not ckpt_dir:
+        timeline = BootTimeline(system, args.vmlinux,
+                                args.boot_events.split(","),
+                                args.boot_phase_stats)
+
+    endPhase()
+
+    if args.dry_run:
+        exit(0 if dryRun(root, [args.sbi, args.disk, args.vmlinux,
+                                args.disk_overlay_base,
+                                args.payload_disk]) else 1)
+
     # Required for long-running jobs
     #m5.disableAllListeners()
 
+    # Has to be done before the backing store of the memory is created
+    if args.share_memory:
+        enableMemorySharing()
+
     # instantiate all of the objects we've created above
-    m5.instantiate()
+    startPhase("instantiate")
+    m5.instantiate(ckpt_dir)
+    endPhase()
+
+    # The physical memory was read, no need to keep the restored copy
+    if path.isdir(restore_dir):
+        shutil.rmtree(restore_dir)
 
     globalStart = time.time()
 
+    # m5.simulate() with the periodic checkpoints (if any)
+    simulate = periodic.simulate if periodic else m5.simulate
+
     print("Running the simulation")
-    exit_event = m5.simulate()
+    if periodic and periodic.phase == "roi":
+        print("Resuming the workload")
+    else:
+        startPhase("simulate:boot")
+        if timeline:
+            exit_event = timeline.simulate()
+        else:
+            exit_event = simulate()
+
+        if args.ckpt_library and exit_event.getCause() == CHECKPOINT_CAUSE:
+            # Booted from scratch, keep the checkpoint for the next runs
+            ckpt_dir = library.newDirectory()
+            m5.checkpoint(ckpt_dir)
+            library.add(ckpt_key, ckpt_dir, ckpt_config)
+            if args.ckpt_library_size:
+                library.gc(parseSize(args.ckpt_library_size),
+                           keep = ckpt_key)
+            exit_event = simulate()
+        endPhase()
 
-    if exit_event.getCause() == "m5_exit instruction encountered":
-        # Reached the start of actual benchmark
-        print("Starting actual workload!")
+        if exit_event.getCause() == "m5_exit instruction encountered":
+            # Reached the start of actual benchmark
+            print("Starting actual workload!")
+        else:
+            print("Unexpected termination of simulation !")
+            finish(exit_event.getCause(), 1)
+
+        if args.boot_only:
+            print("Booted at tick {}".format(m5.curTick()))
+            finish(exit_event.getCause(), 0)
+
+    startPhase("simulate:roi")
+    if args.roi_insts:
+        # Measure a fixed number of instructions after the warmup
+        exit_event, start_tick = simulateInstWindow(system,
+                                    args.warmup_insts, args.roi_insts)
+    elif periodic:
+        start_tick = periodic.startRoi()
+        exit_event = simulate()
+    else:
         m5.stats.reset()
         start_tick = m5.curTick()
-    else:
-        print("Unexpected termination of simulation !")
-        exit(1)
-
-    exit_event = m5.simulate()
+        exit_event = m5.simulate()
+    endPhase()
 
-    if exit_event.getCause() == "m5_exit instruction encountered":
+    if exit_event.getCause() in ("m5_exit instruction encountered",
+                                 ROI_CAUSE):
         # Reached the end of workload of interest
         print("Finshed running the workload!")
         print("Dumping the stats!")
         m5.stats.dump()
         end_tick = m5.curTick()
         m5.stats.reset()
+        if system.hasDetailedCPUs():
+            reportBranchPrediction(system)
+        reportTranslation(system)
+        if mix:
+            reportMix(system, mix, args.mix_isolated)
         print("Simulated time: %.2fs" % ((end_tick-start_tick)/1e12))
-        exit(0)
+        if args.power:
+            reportPower(system)
+        print("Host time: %.2fs (%d event queues)" % (
+              time.time() - globalStart,
+              len(system.cpu) + 1 if args.parallel_eventqs else 1))
+        finish(exit_event.getCause(), 0)
     else:
         print("Unexpected termination of simulation !")
-        exit(1)
\ No newline at end of file
+        finish(exit_event.getCause(), 1)
\ No newline at end of file
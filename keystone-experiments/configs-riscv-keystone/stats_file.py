@@ -0,0 +1,86 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Reading of gem5 output directories outside of gem5.
+"""
+
+import configparser
+import json
+import os
+
+BEGIN = "---------- Begin Simulation Statistics ----------"
+END = "---------- End Simulation Statistics"
+
+def readStats(file_name):
+    """
+    Returns the stats dumps in a gem5 stats.txt file as a list of
+    dictionaries (stat name -> value). Values that cannot be parsed
+    as numbers are kept as strings. For distributions, only the first
+    column of each bucket is kept. The reports and tools use the last
+    dump, the one of the measured region.
+    """
+    dumps = []
+    with open(file_name) as stats:
+        for line in stats:
+            if line.startswith(BEGIN):
+                dumps.append({})
+                continue
+            if line.startswith(END) or not dumps:
+                continue
+            fields = line.split("#")[0].split()
+            if len(fields) < 2:
+                continue
+            try:
+                value = float(fields[1])
+            except ValueError:
+                value = fields[1]
+            dumps[-1][fields[0]] = value
+    return dumps
+
+def ratio(numerator, denominator):
+    """ Returns numerator / denominator, or None if denominator is 0 """
+    return numerator / denominator if denominator else None
+
+def readJson(outdir, name):
+    """ Returns the content of a JSON file in outdir or None """
+    file_name = os.path.join(outdir, name)
+    if not os.path.isfile(file_name):
+        return None
+    with open(file_name) as data:
+        return json.load(data)
+
+def readConfig(file_name):
+    """
+    Returns the SimObjects of a gem5 config.ini file as a dictionary
+    (SimObject path -> dictionary of its parameters).
+    """
+    config = configparser.ConfigParser(interpolation = None,
+                                       strict = False)
+    config.optionxform = str
+    config.read(file_name)
+    return {name: dict(config[name]) for name in config.sections()}
@@ -0,0 +1,347 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Crash-resumable sweep launcher.
+
+Runs the jobs of a sweep file in parallel and keeps their state in a
+journal (journal.sqlite in the sweep directory). Each job runs in its
+own output directory with periodic checkpoints (--ckpt-interval of the
+run scripts). When the launcher is started again after a crash or a
+reboot, finished jobs are skipped and interrupted jobs are resumed from
+their last checkpoint.
+
+Each line of the sweep file holds a job name, the run script and its
+arguments:
+
+    # name        script            arguments
+    aes-o3-1      run_trusted.py    fw_payload.elf rootfs.ext2 o3 1 aes
+    aes-minor-1   run_trusted.py    fw_payload.elf rootfs.ext2 minor 1 aes
+
+    python3 sweep.py run [sweep directory] jobs.txt --gem5 gem5.opt \\
+        --parallel 16 --ckpt-interval 100000000000
+    python3 sweep.py status [sweep directory]
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+from ckpt_library import parseSize
+from stats_file import readJson
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def readJobs(file_name):
+    """ Returns the jobs of a sweep file as (name, script, args) """
+    jobs = []
+    with open(file_name) as sweep:
+        for line in sweep:
+            fields = shlex.split(line, comments = True)
+            if not fields:
+                continue
+            if len(fields) < 2:
+                sys.exit("Invalid sweep line: {}".format(line.strip()))
+            jobs.append((fields[0], fields[1], fields[2:]))
+    return jobs
+
+def checkpointConflicts(args):
+    """
+    Returns the options in args that the run scripts do not accept
+    together with --ckpt-interval.
+    """
+    conflicts = []
+    for i, arg in enumerate(args):
+        name, _, value = arg.partition("=")
+        if name == "--vmlinux":
+            conflicts.append(name)
+        elif name == "--roi-insts":
+            value = value or (args[i + 1] if i + 1 < len(args) else "0")
+            if value != "0":
+                conflicts.append(name)
+    return conflicts
+
+def processId(pid):
+    """
+    Returns the boot id of the host and the start time of process pid,
+    which tell it apart from a later process with the same pid (e.g.,
+    after a reboot), or None if there is no such process.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as boot_id, \
+             open("/proc/{}/stat".format(pid)) as stat:
+            # Fields after the command name, which can contain spaces;
+            # the start time is field 22
+            fields = stat.read().rpartition(")")[2].split()
+            return "{}:{}".format(boot_id.read().strip(), fields[19])
+    except (OSError, IndexError):
+        return None
+
+class Journal(object):
+    """ State of the jobs of a sweep """
+
+    def __init__(self, dir):
+        self.db = sqlite3.connect(os.path.join(dir, "journal.sqlite"),
+                                  timeout = 600)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            name TEXT PRIMARY KEY,
+            script TEXT NOT NULL,
+            args TEXT NOT NULL,
+            state TEXT NOT NULL,
+            host TEXT,
+            pid INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            memory_mb INTEGER,
+            started REAL,
+            finished REAL,
+            exit_code INTEGER,
+            process TEXT)''')
+        # Journals of older launchers do not identify the processes
+        columns = [row[1] for row in
+                   self.db.execute("PRAGMA table_info(jobs)")]
+        if "process" not in columns:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN process TEXT")
+        self.db.commit()
+
+    def add(self, name, script, args):
+        """ Adds a job, jobs already in the journal keep their state """
+        self.db.execute('''INSERT OR IGNORE INTO jobs (name, script, args,
+            state) VALUES (?, ?, ?, 'pending')''',
+            (name, script, json.dumps(args)))
+        self.db.commit()
+
+    def update(self, name, **columns):
+        self.db.execute("UPDATE jobs SET {} WHERE name = ?".format(
+            ", ".join("{} = ?".format(column) for column in columns)),
+            list(columns.values()) + [name])
+        self.db.commit()
+
+    def process(self, name):
+        """ Returns the processId of the running job name """
+        return self.db.execute("SELECT process FROM jobs WHERE name = ?",
+                               (name,)).fetchone()[0]
+
+    def jobs(self, state = None):
+        sql = '''SELECT name, script, args, state, host, pid, attempts,
+            memory_mb, exit_code FROM jobs'''
+        if state:
+            return self.db.execute(sql + " WHERE state = ? ORDER BY name",
+                                   (state,)).fetchall()
+        return self.db.execute(sql + " ORDER BY name").fetchall()
+
+class Sweep(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.dir = os.path.abspath(args.dir)
+        os.makedirs(self.dir, exist_ok = True)
+        self.journal = Journal(self.dir)
+        self.host = socket.gethostname()
+        self.running = {}
+
+    def outdir(self, name):
+        return os.path.join(self.dir, name)
+
+    def command(self, script, args, outdir, extra = []):
+        return [self.args.gem5, "-re", "-d", outdir,
+                os.path.join(CONFIG_DIR, script)] + extra + args
+
+    def recover(self):
+        """
+        Marks the jobs that were running when the launcher stopped as
+        interrupted, waiting for the ones still alive on this host. A
+        job is only alive if its pid belongs to the same process as at
+        launch (same boot and start time), since the pid can be reused
+        after a reboot.
+        """
+        for name, _, _, _, host, pid, _, _, _ in \
+                self.journal.jobs("running"):
+            process = self.journal.process(name)
+            if host == self.host and pid and process and \
+                    processId(pid) == process:
+                print("Waiting for {} (pid {})".format(name, pid))
+                while processId(pid) == process:
+                    time.sleep(10)
+                self.collect(name, None)
+            else:
+                self.journal.update(name, state = "interrupted", pid = None,
+                                    process = None)
+        if self.args.retry_failed:
+            for name, _, _, _, _, _, _, _, _ in self.journal.jobs("failed"):
+                self.journal.update(name, state = "pending")
+
+    def estimateMemory(self, name, script, args):
+        """
+        Returns the host memory needed by a job in MB from a dry run of
+        its configuration, cached in the journal.
+        """
+        dry_dir = os.path.join(self.outdir(name), "dry-run")
+        subprocess.call(self.command(script, args, dry_dir, ["--dry-run"]))
+        estimate = readJson(dry_dir, "dry_run.json")
+        memory_mb = estimate["host_memory_mb"]["total"] if estimate else 0
+        self.journal.update(name, memory_mb = memory_mb)
+        return memory_mb
+
+    def launch(self, name, script, args, attempts):
+        outdir = self.outdir(name)
+        extra = []
+        if self.args.ckpt_interval:
+            extra += ["--ckpt-interval", str(self.args.ckpt_interval)]
+        if self.args.results_store:
+            extra += ["--results-store", self.args.results_store]
+        os.makedirs(outdir, exist_ok = True)
+        # An earlier result would hide a failure of this attempt
+        if os.path.isfile(os.path.join(outdir, "result.json")):
+            os.remove(os.path.join(outdir, "result.json"))
+
+        process = subprocess.Popen(self.command(script, args, outdir, extra),
+                                   stdout = subprocess.DEVNULL)
+        self.running[name] = process
+        self.journal.update(name, state = "running", host = self.host,
+                            pid = process.pid,
+                            process = processId(process.pid),
+                            attempts = attempts + 1, started = time.time())
+        print("Started {} (pid {})".format(name, process.pid))
+
+    def collect(self, name, exit_code):
+        """
+        Records the outcome of a job from its result.json, or from the
+        exit code of gem5 if the run did not write one.
+        """
+        result = readJson(self.outdir(name), "result.json")
+        if result:
+            exit_code = result["exit_code"]
+        state = "done" if exit_code == 0 else "failed"
+        self.journal.update(name, state = state, pid = None, process = None,
+                            finished = time.time(), exit_code = exit_code)
+        print("{} {} (exit code {})".format(name, state, exit_code))
+
+    def run(self):
+        jobs = readJobs(self.args.jobs)
+        # The jobs would only fail once started
+        if self.args.ckpt_interval:
+            conflicts = ["{} ({})".format(name, ", ".join(options))
+                for name, _, args in jobs
+                for options in [checkpointConflicts(args)] if options]
+            if conflicts:
+                sys.exit("--ckpt-interval cannot be used with --roi-insts "
+                         "or --vmlinux: {}".format(", ".join(conflicts)))
+
+        for name, script, args in jobs:
+            self.journal.add(name, script, args)
+        self.recover()
+
+        max_memory = parseSize(self.args.max_memory) >> 20 \
+                     if self.args.max_memory else None
+
+        # Interrupted jobs first, they resume from their checkpoints
+        queue = self.journal.jobs("interrupted") + \
+                self.journal.jobs("pending")
+        memory = {}
+        while queue or self.running:
+            for name, process in list(self.running.items()):
+                if process.poll() is not None:
+                    del self.running[name]
+                    memory.pop(name, None)
+                    self.collect(name, process.returncode)
+
+            while queue and len(self.running) < self.args.parallel:
+                name, script, args, _, _, _, attempts, memory_mb, _ = \
+                    queue[0]
+                args = json.loads(args)
+                if max_memory:
+                    if memory_mb is None:
+                        memory_mb = self.estimateMemory(name, script, args)
+                    # Wait for memory, unless nothing else is running
+                    if memory and sum(memory.values()) + memory_mb > \
+                            max_memory:
+                        break
+                    memory[name] = memory_mb
+                queue.pop(0)
+                self.launch(name, script, args, attempts)
+
+            time.sleep(1)
+
+    def status(self):
+        counts = {}
+        for name, _, _, state, host, pid, attempts, _, exit_code in \
+                self.journal.jobs():
+            counts[state] = counts.get(state, 0) + 1
+            if self.args.verbose:
+                print("{:<24} {:<12} attempts {} {}".format(name, state,
+                      attempts, "exit code {}".format(exit_code)
+                      if exit_code is not None else ""))
+        print(", ".join("{} {}".format(count, state)
+                        for state, count in sorted(counts.items())))
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a sweep of gem5 '
+                'jobs that can be resumed after a crash.')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run (or resume) "
+                    "a sweep")
+    run_parser.add_argument("dir", help="Sweep directory (journal and "
+                            "output directories)")
+    run_parser.add_argument("jobs", help="Sweep file")
+    run_parser.add_argument("--gem5", required=True,
+                            help="Path to the gem5 binary")
+    run_parser.add_argument("--parallel", type=int,
+                            default=os.cpu_count(),
+                            help="Maximum number of jobs running at once")
+    run_parser.add_argument("--max-memory", help="Host memory for the "
+                            "jobs (e.g., 200GB). Jobs are packed by the "
+                            "estimates of their dry runs")
+    run_parser.add_argument("--ckpt-interval", type=int, default=0,
+                            help="Simulated ticks between the periodic "
+                            "checkpoints of the jobs")
+    run_parser.add_argument("--results-store", help="Results store "
+                            "passed to the jobs")
+    run_parser.add_argument("--retry-failed", action="store_true",
+                            help="Run the failed jobs again")
+
+    status_parser = subparsers.add_parser("status", help="Show the "
+                        "state of the jobs")
+    status_parser.add_argument("dir", help="Sweep directory")
+    status_parser.add_argument("--verbose", action="store_true",
+                               help="Show every job")
+    args = parser.parse_args()
+
+    sweep = Sweep(args)
+    if args.command == "run":
+        sweep.run()
+    else:
+        sweep.status()
+
+if __name__ == "__main__":
+    main()
@@ -27,5 +27,18 @@
 #
 # Authors: Jason Lowe-Power
 
-from .system import RiscvSystem
+from .system import RiscvSystem, parseCores
+from .boot_timeline import BootTimeline, DEFAULT_BOOT_EVENTS
 
+from .inst_window import simulateInstWindow, ROI_CAUSE
+from .dry_run import dryRun, writeConfig
+from .memory_sharing import enableMemorySharing
+from .profiling import HostProfiler, SAMPLERS, startPhase, endPhase
+from .periodic_checkpoints import PeriodicCheckpoints
+from .cpu_presets import CPU_PRESETS
+from .branch_prediction import BRANCH_PREDICTORS, reportBranchPrediction
+from .translation import reportTranslation
+from .power import addPowerModels, reportPower
+from .multiprogram import parseMix, writeMixCommands, reportMix
+from .interference import noiseHarts, writeNoiseCommands, \
+                          reportInterference
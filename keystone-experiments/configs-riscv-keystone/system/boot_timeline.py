@@ -0,0 +1,182 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+import struct
+
+import m5
+from m5.objects import *
+from os import path
+
+'''
+Boot phase breakdown based on PC events on kernel functions.
+
+The addresses of the requested kernel functions are looked up in the
+vmlinux symbol table and a PcCountTracker probe is attached to every
+CPU. Each time a hart retires the first instruction of one of these
+functions, the simulation exits and the tick is recorded. Nothing in
+the guest has to change.
+
+Requires a gem5 build with the PcCountTracker probes (cpu/probes, gem5
+23.0 or newer). They are only imported when a BootTimeline is created,
+so the rest of the package works on older builds.
+'''
+
+# Kernel functions used when the user does not ask for specific ones.
+# Everything before start_kernel is spent in the firmware (bbl/OpenSBI).
+DEFAULT_BOOT_EVENTS = ["start_kernel", "rest_init", "run_init_process"]
+
+# Exit cause raised by PcCountTrackerManager when a target PC is reached
+PC_EVENT_CAUSE = "simpoint starting point found"
+
+def readElfSymbols(file_name, names):
+    """
+    Returns a dictionary mapping each of the given symbol names to its
+    address, as found in the symbol table of a 64-bit little endian ELF
+    file (e.g., vmlinux). Symbols that are not found are left out.
+    """
+    with open(file_name, "rb") as elf:
+        data = elf.read()
+
+    if data[:4] != b"\x7fELF" or data[4] != 2 or data[5] != 1:
+        m5.fatal("{} is not a 64-bit little endian ELF file".format(
+                 file_name))
+
+    # Section header table location from the ELF header
+    shoff, = struct.unpack_from("<Q", data, 0x28)
+    shentsize, shnum = struct.unpack_from("<HH", data, 0x3a)
+
+    sections = []
+    for i in range(shnum):
+        # sh_type, sh_offset, sh_size and sh_link of each section
+        sh_type, = struct.unpack_from("<I", data, shoff + i * shentsize + 4)
+        sh_offset, sh_size, sh_link = struct.unpack_from("<QQI", data,
+                                        shoff + i * shentsize + 0x18)
+        sections.append((sh_type, sh_offset, sh_size, sh_link))
+
+    wanted = set(names)
+    symbols = {}
+    for sh_type, sh_offset, sh_size, sh_link in sections:
+        # SHT_SYMTAB
+        if sh_type != 2:
+            continue
+        str_offset = sections[sh_link][1]
+        for sym in range(sh_offset, sh_offset + sh_size, 24):
+            st_name, st_info, _, _, st_value, _ = \
+                struct.unpack_from("<IBBHQQ", data, sym)
+            # STT_FUNC symbols only
+            if st_info & 0xf != 2:
+                continue
+            end = data.index(b"\0", str_offset + st_name)
+            name = data[str_offset + st_name:end].decode()
+            if name in wanted and name not in symbols:
+                symbols[name] = st_value
+
+    return symbols
+
+class BootTimeline(object):
+    """
+    Records the tick at which the boot reaches each of the given kernel
+    functions and writes the resulting timeline to the output directory.
+    """
+
+    def __init__(self, system, vmlinux, events = DEFAULT_BOOT_EVENTS,
+                 dump_stats = False):
+        try:
+            from m5.params import PcCountPair
+            from m5.objects import PcCountTracker, PcCountTrackerManager
+        except ImportError:
+            m5.fatal("The boot timeline needs a gem5 build with the "
+                     "PcCountTracker probes")
+
+        self.dump_stats = dump_stats
+
+        symbols = readElfSymbols(vmlinux, events)
+        missing = [name for name in events if name not in symbols]
+        if missing:
+            m5.fatal("Symbols {} not found in {}".format(
+                     ", ".join(missing), vmlinux))
+
+        # Keep the user given order so that phases are named after
+        # consecutive events
+        self.events = [(name, symbols[name]) for name in events]
+        self.names = {pc: name for name, pc in self.events}
+        self.timeline = [("firmware", 0)]
+
+        targets = [PcCountPair(pc, 1) for _, pc in self.events]
+
+        system.boot_pc_manager = PcCountTrackerManager(targets = targets)
+        for cpu in system.cpu:
+            cpu.boot_pc_tracker = PcCountTracker(targets = targets,
+                                    core = cpu,
+                                    ptmanager = system.boot_pc_manager)
+        self.manager = system.boot_pc_manager
+
+    def simulate(self):
+        """
+        Simulates until an exit event that is not one of the boot PC
+        events happens (e.g., the guest start marker), records the boot
+        events on the way and returns that exit event.
+        """
+        exit_event = m5.simulate()
+        while exit_event.getCause() == PC_EVENT_CAUSE:
+            pair = self.manager.getCurrentPcCountPair()
+            name = self.names.get(pair.getPC(), hex(pair.getPC()))
+            print("Reached {} at tick {}".format(name, m5.curTick()))
+            self.endPhase(name)
+            exit_event = m5.simulate()
+
+        self.endPhase("end")
+        self.write()
+        return exit_event
+
+    def endPhase(self, name):
+        if self.dump_stats:
+            m5.stats.dump()
+            m5.stats.reset()
+        self.timeline.append((name, m5.curTick()))
+
+    def write(self):
+        phases = []
+        for (name, start), (_, end) in zip(self.timeline,
+                                           self.timeline[1:]):
+            phases.append({
+                "phase": name,
+                "start_tick": start,
+                "end_tick": end,
+                "ticks": end - start,
+            })
+
+        with open(path.join(m5.options.outdir,
+                            "boot_timeline.json"), "w") as out:
+            events = {name: hex(pc) for name, pc in self.events}
+            json.dump({"events": events, "phases": phases}, out, indent=4)
+
+        print("Boot timeline:")
+        for phase in phases:
+            print("  {:<20} {:>16} ticks ({:.6f}s)".format(phase["phase"],
+                  phase["ticks"], phase["ticks"] / 1e12))
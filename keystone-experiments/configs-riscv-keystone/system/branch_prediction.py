@@ -0,0 +1,95 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+
+import m5
+from m5.objects import *
+from os import path
+
+from stats_file import ratio, readStats
+
+'''
+Branch predictor selection and accuracy report.
+
+The minor and o3 CPUs use the gem5 default predictor (TournamentBP)
+unless one of BRANCH_PREDICTORS is selected. After the measured region
+the predictor stats of the last dump are summarized per CPU (conditional
+mispredict rate, MPKI, BTB hit rate, indirect and RAS mispredicts) and
+written to branch_prediction.json in the output directory.
+
+gem5 has no perfect (oracle) predictor, a limit study needs a change to
+the CPU models.
+'''
+
+BRANCH_PREDICTORS = {
+    "local": LocalBP,
+    "bimode": BiModeBP,
+    "tournament": TournamentBP,
+    "ltage": LTAGE,
+    "tage-sc-l": TAGE_SC_L_64KB,
+    "tage-sc-l-8kb": TAGE_SC_L_8KB,
+}
+
+def reportBranchPrediction(system):
+    """
+    Writes the accuracy of the branch predictor of each CPU in the last
+    stats dump to branch_prediction.json and prints it.
+    """
+    dump = readStats(path.join(m5.options.outdir, "stats.txt"))[-1]
+
+    report = {}
+    for cpu in system.cpu:
+        prefix = cpu.path() + ".branchPred."
+        if prefix + "lookups" not in dump:
+            continue
+        stat = lambda name: dump.get(prefix + name, 0)
+        insts = dump.get(cpu.path() + ".committedInsts", 0)
+        report[cpu.path()] = {
+            "predictor": type(cpu.branchPred).__name__,
+            "lookups": stat("lookups"),
+            "cond_predicted": stat("condPredicted"),
+            "cond_incorrect": stat("condIncorrect"),
+            "cond_mispredict_rate": ratio(stat("condIncorrect"),
+                                          stat("condPredicted")),
+            "mpki": ratio(1000 * stat("condIncorrect"), insts),
+            "btb_hit_rate": ratio(stat("BTBHits"), stat("BTBLookups")),
+            "indirect_mispredicted": stat("indirectMispredicted"),
+            "ras_incorrect": stat("RASIncorrect"),
+        }
+
+    with open(path.join(m5.options.outdir,
+                        "branch_prediction.json"), "w") as out:
+        json.dump(report, out, indent=4)
+
+    for name, cpu in report.items():
+        print("{}: {} conditional mispredict rate {}, MPKI {}".format(name,
+              cpu["predictor"],
+              "{:.2%}".format(cpu["cond_mispredict_rate"])
+              if cpu["cond_mispredict_rate"] is not None else "-",
+              "{:.2f}".format(cpu["mpki"])
+              if cpu["mpki"] is not None else "-"))
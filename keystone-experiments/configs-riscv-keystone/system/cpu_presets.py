@@ -0,0 +1,187 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+from m5.objects import *
+
+'''
+CPU presets modeled on real RISC-V cores.
+
+The gem5 defaults of MinorCPU and DerivO3CPU describe neither the SiFive
+cores nor BOOM. The presets below set the pipeline widths, the queue
+sizes and the functional units (counts and latencies) after the public
+descriptions of these cores:
+
+- u54: SiFive U54 (FU540), single issue, in-order, 5 stages.
+- u74: SiFive U74 (FU740), dual issue, in-order, 8 stages.
+- boom-small, boom-medium, boom-large: the SmallBoomConfig,
+  MediumBoomConfig and LargeBoomConfig of BOOM v3 (issue queue, ROB,
+  load/store queue and register file sizes, issue widths).
+
+They are approximations: gem5 has no model of the SiFive or BOOM front
+ends and memory pipelines, so the results should be checked against the
+hardware (see calibration) before they are used as absolute numbers.
+'''
+
+# In-order SiFive cores (MinorCPU)
+
+class U54CPU(MinorCPU):
+    """ SiFive U54: single issue, in-order """
+
+    fetch1FetchLimit = 1
+    fetch2InputBufferSize = 2
+    decodeInputWidth = 1
+    executeInputWidth = 1
+    executeIssueLimit = 1
+    executeMemoryIssueLimit = 1
+    executeCommitLimit = 1
+    executeMemoryCommitLimit = 1
+    executeLSQStoreBufferSize = 4
+    executeFuncUnits = MinorFUPool(funcUnits = [
+        MinorDefaultIntFU(),
+        # Pipelined multiplier, iterative divider
+        MinorDefaultIntMulFU(opLat = 3),
+        MinorDefaultIntDivFU(opLat = 20, issueLat = 20),
+        MinorDefaultFloatSimdFU(opLat = 5),
+        MinorDefaultPredFU(),
+        # 2-cycle load-use latency
+        MinorDefaultMemFU(opLat = 2),
+        MinorDefaultMiscFU(),
+    ])
+
+class U74CPU(MinorCPU):
+    """ SiFive U74: dual issue, in-order """
+
+    fetch1FetchLimit = 1
+    fetch2InputBufferSize = 2
+    decodeInputWidth = 2
+    executeInputWidth = 2
+    executeIssueLimit = 2
+    executeMemoryIssueLimit = 1
+    executeCommitLimit = 2
+    executeMemoryCommitLimit = 1
+    executeLSQStoreBufferSize = 8
+    executeFuncUnits = MinorFUPool(funcUnits = [
+        # Two ALU pipes, one of them with the multiplier
+        MinorDefaultIntFU(),
+        MinorDefaultIntFU(),
+        MinorDefaultIntMulFU(opLat = 3),
+        MinorDefaultIntDivFU(opLat = 20, issueLat = 20),
+        MinorDefaultFloatSimdFU(opLat = 5),
+        MinorDefaultPredFU(),
+        MinorDefaultMemFU(opLat = 2),
+        MinorDefaultMiscFU(),
+    ])
+
+# Out-of-order BOOM v3 configurations (DerivO3CPU)
+
+def boomFUPool(int_alus, fp_units, mem_units):
+    """
+    Functional units of a BOOM core with the given numbers of integer,
+    floating point and memory issue slots. One integer unit also does
+    the multiplications and divisions.
+    """
+    return FUPool(FUList = [
+        IntALU(count = int_alus),
+        IntMultDiv(count = 1),
+        FP_ALU(count = fp_units),
+        FP_MultDiv(count = fp_units),
+        ReadPort(count = 0),
+        WritePort(count = 0),
+        RdWrPort(count = mem_units),
+        SIMD_Unit(count = 1),
+        PredALU(count = 1),
+        IprPort(count = 1),
+    ])
+
+class SmallBoomCPU(DerivO3CPU):
+    """ BOOM v3 SmallBoomConfig: 1-wide decode, 32-entry ROB """
+
+    fetchWidth = 4
+    decodeWidth = 1
+    renameWidth = 1
+    dispatchWidth = 1
+    issueWidth = 3
+    wbWidth = 3
+    commitWidth = 1
+    squashWidth = 1
+    fetchQueueSize = 8
+    numROBEntries = 32
+    numIQEntries = 24
+    LQEntries = 8
+    SQEntries = 8
+    numPhysIntRegs = 52
+    numPhysFloatRegs = 48
+    fuPool = boomFUPool(int_alus = 1, fp_units = 1, mem_units = 1)
+
+class MediumBoomCPU(DerivO3CPU):
+    """ BOOM v3 MediumBoomConfig: 2-wide decode, 64-entry ROB """
+
+    fetchWidth = 4
+    decodeWidth = 2
+    renameWidth = 2
+    dispatchWidth = 2
+    issueWidth = 4
+    wbWidth = 4
+    commitWidth = 2
+    squashWidth = 2
+    fetchQueueSize = 16
+    numROBEntries = 64
+    numIQEntries = 48
+    LQEntries = 16
+    SQEntries = 16
+    numPhysIntRegs = 80
+    numPhysFloatRegs = 64
+    fuPool = boomFUPool(int_alus = 2, fp_units = 1, mem_units = 1)
+
+class LargeBoomCPU(DerivO3CPU):
+    """ BOOM v3 LargeBoomConfig: 3-wide decode, 96-entry ROB """
+
+    fetchWidth = 8
+    decodeWidth = 3
+    renameWidth = 3
+    dispatchWidth = 3
+    issueWidth = 5
+    wbWidth = 5
+    commitWidth = 3
+    squashWidth = 3
+    fetchQueueSize = 24
+    numROBEntries = 96
+    numIQEntries = 72
+    LQEntries = 24
+    SQEntries = 24
+    numPhysIntRegs = 100
+    numPhysFloatRegs = 96
+    fuPool = boomFUPool(int_alus = 3, fp_units = 1, mem_units = 1)
+
+# Preset name -> (CPU type it refines, CPU class)
+CPU_PRESETS = {
+    "u54": ("minor", U54CPU),
+    "u74": ("minor", U74CPU),
+    "boom-small": ("o3", SmallBoomCPU),
+    "boom-medium": ("o3", MediumBoomCPU),
+    "boom-large": ("o3", LargeBoomCPU),
+}
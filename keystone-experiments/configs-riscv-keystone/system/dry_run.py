@@ -0,0 +1,168 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+import re
+
+import m5
+from m5.objects import *
+from os import path
+
+'''
+Dry run mode for the run scripts.
+
+Builds the whole configuration, validates it and writes config.ini,
+config.json and the DTB to the output directory together with an
+estimate of the host memory needed by the simulation. Meant to be
+called before m5.instantiate() so that nothing is simulated.
+'''
+
+# Rough host memory (in MB) needed by gem5 itself and by each CPU model
+# (including its TLBs, walkers and interrupt controller).
+BASE_HOST_MEMORY = 256
+CPU_HOST_MEMORY = {
+    "AtomicSimpleCPU": 8,
+    "TimingSimpleCPU": 8,
+    "MinorCPU": 32,
+    "DerivO3CPU": 64,
+}
+
+# Caches need memory for the data plus the tags and the MSHRs
+CACHE_HOST_OVERHEAD = 1.5
+
+def memparse(value):
+    """
+    Converts a size in the format of the Linux kernel command line
+    (e.g., 512M) to bytes.
+    """
+    match = re.match(r"^(\d+)([KMGT]?)$", value, re.IGNORECASE)
+    if not match:
+        return None
+    shift = {"": 0, "k": 10, "m": 20, "g": 30, "t": 40}
+    return int(match.group(1)) << shift[match.group(2).lower()]
+
+def checkSystem(system, files):
+    """
+    Returns the list of problems found in the given system and in the
+    given input files.
+    """
+    errors = []
+
+    for file_name in files:
+        if file_name and not path.isfile(file_name):
+            errors.append("File {} does not exist".format(file_name))
+
+    if not system.cpu:
+        errors.append("The system has no CPUs")
+
+    mem_size = sum(int(mem_range.size()) for mem_range in system.mem_ranges)
+
+    # The contiguous memory allocator region has to fit in the memory
+    for arg in str(system.workload.command_line).split():
+        if arg.startswith("cma="):
+            cma_size = memparse(arg[len("cma="):].split("@")[0])
+            if cma_size is None:
+                errors.append("Cannot parse {}".format(arg))
+            elif cma_size >= mem_size:
+                errors.append("{} does not fit in {}MB of memory".format(
+                              arg, mem_size >> 20))
+
+    if not path.isfile(str(system.workload.dtb_filename)):
+        errors.append("DTB {} was not generated".format(
+                      system.workload.dtb_filename))
+
+    return errors
+
+def estimateHostMemory(system):
+    """
+    Returns an estimate (in MB) of the host memory needed to simulate
+    the given system, broken down by component.
+    """
+    mem_size = sum(int(mem_range.size()) for mem_range in system.mem_ranges)
+
+    cpus = sum(CPU_HOST_MEMORY.get(cpu.type, 64)
+               for cpu in system.cpu)
+
+    caches = [obj for obj in system.descendants() if isinstance(obj, Cache)]
+    cache_size = sum(int(cache.size) for cache in caches)
+
+    estimate = {
+        "base": BASE_HOST_MEMORY,
+        "memory": mem_size >> 20,
+        "cpus": cpus,
+        "caches": int(cache_size * CACHE_HOST_OVERHEAD) >> 20,
+    }
+    estimate["total"] = sum(estimate.values())
+    return estimate, len(caches)
+
+def writeConfig(root):
+    """
+    Writes config.ini and config.json the same way m5.instantiate() does.
+    """
+    # SimObject-valued params have to be in the hierarchy first, so that
+    # they get the same paths as in config.ini of the real run
+    for obj in root.descendants():
+        obj.adoptOrphanParams()
+
+    for obj in root.descendants():
+        obj.unproxyParams()
+
+    with open(path.join(m5.options.outdir, "config.ini"), "w") as ini:
+        # Sorted like gem5 does for easier diffing
+        for obj in sorted(root.descendants(), key=lambda o: o.path()):
+            obj.print_ini(ini)
+
+    with open(path.join(m5.options.outdir, "config.json"), "w") as out:
+        json.dump(root.get_config_as_dict(), out, indent=4)
+
+def dryRun(root, files):
+    """
+    Validates the configuration under root and writes config.ini,
+    config.json and a resource estimate (dry_run.json) to the output
+    directory. The DTB is already written when the system is created.
+    Returns True if no problems were found.
+    """
+    system = root.system
+
+    errors = checkSystem(system, files)
+    writeConfig(root)
+    estimate, num_caches = estimateHostMemory(system)
+
+    with open(path.join(m5.options.outdir, "dry_run.json"), "w") as out:
+        json.dump({
+            "valid": not errors,
+            "errors": errors,
+            "num_cpus": len(system.cpu),
+            "num_caches": num_caches,
+            "host_memory_mb": estimate,
+        }, out, indent=4)
+
+    for error in errors:
+        print("Error: {}".format(error))
+    print("Estimated host memory: {}MB".format(estimate["total"]))
+
+    return not errors
@@ -0,0 +1,92 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import m5
+
+'''
+Measurement windows bounded by committed instruction counts.
+
+Instead of measuring everything between the two guest m5 exit calls,
+the region after the start marker is split into a warmup window of M
+instructions and a measured window of exactly N instructions. The
+windows end as soon as any hardware thread in the system commits the
+requested number of instructions (like max_insts_any_thread), so the
+same window can be compared across CPU models.
+'''
+
+WARMUP_CAUSE = "warmup instruction count reached"
+ROI_CAUSE = "roi instruction count reached"
+
+GUEST_EXIT_CAUSE = "m5_exit instruction encountered"
+
+def scheduleInstStops(system, insts, cause):
+    """
+    Schedules an exit event with the given cause on every hardware thread
+    once it has committed insts more instructions.
+    """
+    for cpu in system.cpu:
+        for tid in range(cpu.numThreads):
+            cpu.scheduleInstStop(tid, insts, cause)
+
+def simulateSkipping(ignore = ()):
+    """
+    Simulates until the next exit event. Exit events with causes in
+    ignore (e.g., the events still pending on the other threads from a
+    previous window) are skipped.
+    """
+    exit_event = m5.simulate()
+    while exit_event.getCause() in ignore:
+        exit_event = m5.simulate()
+    return exit_event
+
+def simulateInstWindow(system, warmup_insts, roi_insts):
+    """
+    Called at the start marker. Warms up for warmup_insts instructions,
+    resets the stats and simulates roi_insts instructions. Returns the
+    exit event that ended the window and the tick at which the measured
+    window started. The exit event cause is ROI_CAUSE unless the guest
+    finished (or something else happened) before the window ended.
+    """
+    if warmup_insts:
+        print("Warming up for {} instructions".format(warmup_insts))
+        scheduleInstStops(system, warmup_insts, WARMUP_CAUSE)
+        exit_event = simulateSkipping()
+        if exit_event.getCause() != WARMUP_CAUSE:
+            m5.fatal("Warmup window ended early: {}".format(
+                     exit_event.getCause()))
+
+    m5.stats.reset()
+    start_tick = m5.curTick()
+
+    print("Measuring {} instructions".format(roi_insts))
+    scheduleInstStops(system, roi_insts, ROI_CAUSE)
+    exit_event = simulateSkipping(ignore = (WARMUP_CAUSE,))
+    if exit_event.getCause() != ROI_CAUSE:
+        print("Measured window ended early: {}".format(
+              exit_event.getCause()))
+
+    return exit_event, start_tick
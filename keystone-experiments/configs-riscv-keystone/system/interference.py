@@ -0,0 +1,102 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+
+import m5
+from os import path
+
+from stats_file import readStats
+from .multiprogram import hartStats, memoryStats
+
+'''
+Enclave interference study.
+
+The enclave benchmark runs pinned to one hart while untrusted noise (an
+rv8 benchmark run natively in an endless loop, e.g., qsort for memory or
+primes for compute) runs on some of the other harts. The noise starts
+before the start marker, so the measured region, from the start marker
+to the end of the enclave benchmark, only times the enclave and sees the
+noise in its steady state.
+
+The slowdown of the enclave against the run without noise is computed
+from the interference.json files of the runs (see interference.py).
+'''
+
+# Native rv8 benchmark run by the noise harts
+NOISE_COMMAND = "rv8-bench/riscv64/{}.O3"
+
+def noiseHarts(enclave_hart, num_noise, num_cpus):
+    """
+    Returns the first num_noise harts other than enclave_hart, or all of
+    them if num_noise is None.
+    """
+    if enclave_hart >= num_cpus:
+        m5.fatal("The enclave hart {} does not exist".format(enclave_hart))
+    others = [hart for hart in range(num_cpus) if hart != enclave_hart]
+    if num_noise is None:
+        return others
+    if num_noise > len(others):
+        m5.fatal("There are only {} harts for the noise".format(
+                 len(others)))
+    return others[:num_noise]
+
+def writeNoiseCommands(bench_file, noise, harts):
+    """
+    Writes the guest script lines that start noise in an endless loop on
+    each of harts.
+    """
+    for hart in harts:
+        bench_file.write("taskset -c {} sh -c 'while :; do {} > "
+                         "/dev/null; done' & \n".format(hart,
+                         NOISE_COMMAND.format(noise)))
+
+def reportInterference(system, enclave_hart, noise, harts):
+    """
+    Writes the measured region of the enclave, the stats of its hart and
+    of the noise harts in the last stats dump to interference.json and
+    prints them.
+    """
+    dump = readStats(path.join(m5.options.outdir, "stats.txt"))[-1]
+
+    report = {
+        "enclave_hart": enclave_hart,
+        "enclave_sim_seconds": dump.get("simSeconds", 0),
+        "enclave": hartStats(system.cpu[enclave_hart], dump),
+        "noise": noise,
+        "noise_harts": {hart: hartStats(system.cpu[hart], dump)
+                        for hart in harts},
+        "memory": memoryStats(system, dump),
+    }
+    with open(path.join(m5.options.outdir, "interference.json"),
+              "w") as out:
+        json.dump(report, out, indent=4)
+
+    print("Enclave on hart {} with {} on {} harts: {:.6f}s, IPC {}".format(
+          enclave_hart, noise, len(harts), report["enclave_sim_seconds"],
+          "{:.3f}".format(report["enclave"]["ipc"])
+          if report["enclave"]["ipc"] else "-"))
@@ -0,0 +1,77 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import ctypes
+import ctypes.util
+import os
+
+from m5.util import inform, warn
+
+'''
+Sharing of the simulated physical memory between parallel gem5 jobs.
+
+gem5 allocates the full memory range of the system for each process
+and, when restoring a checkpoint, writes the whole .pmem image into it,
+so every job restored from the same checkpoint holds its own copy of
+the same pages. gem5 can not map a checkpoint image copy-on-write, but
+the host kernel can merge identical anonymous pages across processes
+(KSM) and split them again on the first write. This enables KSM for the
+whole gem5 process; it must be called before m5.instantiate() so that
+the backing store is covered as well.
+'''
+
+# From linux/prctl.h (Linux 6.4 and later)
+PR_SET_MEMORY_MERGE = 67
+
+KSM_SYSFS = "/sys/kernel/mm/ksm"
+
+def ksmRunning():
+    try:
+        with open(os.path.join(KSM_SYSFS, "run")) as run:
+            return run.read().strip() == "1"
+    except OSError:
+        return False
+
+def enableMemorySharing():
+    """
+    Makes all the memory of this process (including the simulated
+    physical memory) mergeable with identical pages of other processes.
+    Returns True on success.
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno = True)
+    if libc.prctl(PR_SET_MEMORY_MERGE, 1, 0, 0, 0) != 0:
+        warn("Could not enable memory merging: {}".format(
+             os.strerror(ctypes.get_errno())))
+        return False
+
+    if not ksmRunning():
+        warn("KSM is not running, pages will not be shared until "
+             "{}/run is set to 1".format(KSM_SYSFS))
+    else:
+        inform("Simulated memory will be shared with identical pages "
+               "of other processes")
+    return True
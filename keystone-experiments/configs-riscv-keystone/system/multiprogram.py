@@ -0,0 +1,172 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+
+import m5
+from os import path
+
+from stats_file import readJson, ratio, readStats
+
+'''
+Multi-programmed workloads.
+
+A mix such as aes:0,sha512:1,qsort:2 runs each benchmark pinned to its
+hart. The benchmarks wait in a spin loop for a file that the guest
+script creates right after the start marker, so they all start within
+a few instructions of the measured region. Each benchmark exits the
+simulation when it finishes, so the measured region ends when the first
+one does and all the harts of the mix are busy during the whole region.
+
+The report has the committed instructions and the IPC of each hart, the
+L1 miss rates and the memory controller queueing, and with the IPCs of
+the benchmarks running alone (from single benchmark mixes) the weighted
+speedup, the harmonic speedup and the slowdown of each benchmark.
+'''
+
+# File the benchmarks of a mix wait for
+MIX_START_FILE = "/tmp/mix_start"
+
+def parseMix(spec, num_cpus):
+    """
+    Parses a mix such as aes:0,sha512:1 into a list of (benchmark, hart)
+    pairs. A hart runs at most one benchmark.
+    """
+    mix = []
+    for item in spec.split(","):
+        bench, _, hart = item.partition(":")
+        if not bench or not hart.isdigit() or int(hart) >= num_cpus:
+            m5.fatal("Invalid mix item {}, expected benchmark:hart with "
+                     "a hart below {}".format(item, num_cpus))
+        mix.append((bench, int(hart)))
+    harts = [hart for _, hart in mix]
+    if len(set(harts)) != len(harts):
+        m5.fatal("Mix {} runs several benchmarks on a hart".format(spec))
+    return mix
+
+def writeMixCommands(bench_file, mix, command):
+    """
+    Writes the guest script lines that start the benchmarks of mix
+    (command(bench) gives the command line of a benchmark) up to and
+    including the start marker.
+    """
+    bench_file.write('rm -f {} \n'.format(MIX_START_FILE))
+    for bench, hart in mix:
+        bench_file.write("taskset -c {} sh -c 'until [ -e {} ]; do :; "
+                         "done; {}; /sbin/m5 exit' & \n".format(hart,
+                         MIX_START_FILE, command(bench)))
+    bench_file.write('/sbin/m5 exit \n')
+    bench_file.write('touch {} \n'.format(MIX_START_FILE))
+    bench_file.write('wait \n')
+
+def hartStats(cpu, dump):
+    """ Returns the instructions, IPC and L1 miss rates of cpu in dump """
+    stat = lambda name: dump.get(cpu.path() + "." + name, 0)
+    # The simple CPUs count instructions per thread context
+    insts = stat("committedInsts") or stat("exec_context.thread_0.numInsts")
+    return {
+        "cpu": cpu.path(),
+        "committed_insts": insts,
+        "cycles": stat("numCycles"),
+        "ipc": ratio(insts, stat("numCycles")),
+        "icache_miss_rate": stat("icache.overallMissRate::total"),
+        "dcache_miss_rate": stat("dcache.overallMissRate::total"),
+    }
+
+def memoryStats(system, dump):
+    """ Returns the requests and queueing of each memory controller """
+    memory = {}
+    for ctrl in system.mem_cntrls:
+        stat = lambda name: dump.get(ctrl.path() + "." + name)
+        memory[ctrl.path()] = {
+            "read_reqs": stat("readReqs"),
+            "write_reqs": stat("writeReqs"),
+            "avg_read_queue_length": stat("avgRdQLen"),
+            "avg_write_queue_length": stat("avgWrQLen"),
+            "avg_mem_access_latency_ticks": stat("dram.avgMemAccLat"),
+        }
+    return memory
+
+def readIsolatedIPCs(outdirs):
+    """
+    Returns the IPC of each benchmark from the mix.json files of the
+    given output directories of single benchmark runs.
+    """
+    ipcs = {}
+    for outdir in outdirs:
+        report = readJson(outdir, "mix.json")
+        if not report or len(report["harts"]) != 1:
+            m5.fatal("{} has no single benchmark mix.json".format(outdir))
+        hart, = report["harts"].values()
+        ipcs[hart["bench"]] = hart["ipc"]
+    return ipcs
+
+def reportMix(system, mix, isolated = []):
+    """
+    Writes the per-hart and throughput metrics of mix in the last stats
+    dump to mix.json and prints them. isolated are output directories of
+    runs of the benchmarks alone.
+    """
+    dump = readStats(path.join(m5.options.outdir, "stats.txt"))[-1]
+    alone = readIsolatedIPCs(isolated)
+
+    harts = {}
+    for bench, hart in mix:
+        harts[hart] = dict(hartStats(system.cpu[hart], dump), bench = bench)
+        harts[hart]["alone_ipc"] = alone.get(bench)
+        harts[hart]["slowdown"] = ratio(alone.get(bench),
+                                        harts[hart]["ipc"]) \
+                                  if bench in alone else None
+
+    report = {
+        "sim_seconds": dump.get("simSeconds", 0),
+        "harts": harts,
+        "memory": memoryStats(system, dump),
+        "throughput_ipc": sum(hart["ipc"] or 0 for hart in harts.values()),
+    }
+    # Speedups against the benchmarks running alone
+    if all(hart["slowdown"] for hart in harts.values()):
+        report["weighted_speedup"] = sum(1 / hart["slowdown"]
+                                         for hart in harts.values())
+        report["harmonic_speedup"] = len(harts) / sum(hart["slowdown"]
+                                     for hart in harts.values())
+        report["max_slowdown"] = max(hart["slowdown"]
+                                     for hart in harts.values())
+
+    with open(path.join(m5.options.outdir, "mix.json"), "w") as out:
+        json.dump(report, out, indent=4)
+
+    for hart, values in sorted(harts.items()):
+        print("Hart {} {}: {:.0f} instructions, IPC {}{}".format(hart,
+              values["bench"], values["committed_insts"],
+              "{:.3f}".format(values["ipc"]) if values["ipc"] else "-",
+              ", slowdown {:.2f}x".format(values["slowdown"])
+              if values["slowdown"] else ""))
+    print("Throughput: {:.3f} IPC".format(report["throughput_ipc"]))
+    if "weighted_speedup" in report:
+        print("Weighted speedup: {:.3f}, harmonic speedup: {:.3f}".format(
+              report["weighted_speedup"], report["harmonic_speedup"]))
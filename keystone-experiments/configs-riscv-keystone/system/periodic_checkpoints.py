@@ -0,0 +1,175 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+import os
+import shutil
+
+import m5
+from os import path
+
+from stats_file import BEGIN
+
+'''
+Periodic checkpoints for crash-resumable runs.
+
+The simulation is interrupted every N simulated ticks and a checkpoint
+of the whole system is written to resume.cpt in the output directory,
+replacing the previous one. If the job is killed (e.g., the node
+reboots), running it again with the same output directory resumes from
+that checkpoint, so at most one interval of simulation is lost.
+
+gem5 does not keep the stats in checkpoints. In the measured region the
+stats are dumped (without reset) at each checkpoint and the last dump
+is kept with the checkpoint. At the end of the run the intermediate
+dumps are removed from stats.txt, which then has one dump per part of
+the run between resumes: a single dump if the run was not interrupted,
+so its last dump covers the whole region like without checkpoints.
+After a resume the counters start again from zero, the counters of the
+whole region are the sum of the dumps. The caches are cold after a
+resume.
+'''
+
+# Exit cause of m5.simulate() when the given number of ticks has passed
+LIMIT_CAUSE = "simulate() limit reached"
+
+class PeriodicCheckpoints(object):
+    """
+    Simulates with a checkpoint every interval ticks and resumes from the
+    last one.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.outdir = m5.options.outdir
+        self.dir = path.join(self.outdir, "resume.cpt")
+        # Phase of the run ("boot" up to the start marker, then "roi")
+        self.phase = "boot"
+        self.start_tick = None
+        self.resumed_at = []
+        self.stats_prefix = ""
+
+    def resumeDirectory(self):
+        """
+        Returns the checkpoint to resume from or None if the run starts
+        from the beginning. The state of the run is loaded with it.
+        """
+        # A crash while replacing the checkpoint leaves the previous one
+        for dir in [self.dir, self.dir + ".old"]:
+            if path.isfile(path.join(dir, "resume.json")):
+                break
+        else:
+            return None
+
+        with open(path.join(dir, "resume.json")) as state_file:
+            state = json.load(state_file)
+        self.phase = state["phase"]
+        self.start_tick = state["start_tick"]
+        self.resumed_at = state["resumed_at"] + [state["tick"]]
+        if path.isfile(path.join(dir, "stats.txt")):
+            with open(path.join(dir, "stats.txt")) as stats:
+                self.stats_prefix = stats.read()
+        return dir
+
+    def simulate(self):
+        """
+        Simulates until an exit event other than the end of an interval
+        and returns it. A checkpoint is taken at the end of each interval.
+        """
+        while True:
+            exit_event = m5.simulate(self.interval)
+            if exit_event.getCause() != LIMIT_CAUSE:
+                return exit_event
+            self.checkpoint()
+
+    def startRoi(self):
+        """
+        Called at the start marker. Resets the stats and returns the
+        start tick of the measured region, unless the run was resumed in
+        that region already.
+        """
+        if self.phase != "roi":
+            m5.stats.reset()
+            self.phase = "roi"
+            self.start_tick = m5.curTick()
+        return self.start_tick
+
+    def statsContent(self):
+        """
+        Returns the last dump of each part of the run between resumes
+        (including the current one).
+        """
+        stats_file = path.join(self.outdir, "stats.txt")
+        content = ""
+        if path.isfile(stats_file):
+            with open(stats_file) as stats:
+                content = stats.read()
+        # The earlier dumps of this part are intermediate
+        last = content.rfind(BEGIN)
+        return self.stats_prefix + (content[last:] if last >= 0 else "")
+
+    def checkpoint(self):
+        if self.phase == "roi":
+            m5.stats.dump()
+
+        new_dir = self.dir + ".new"
+        old_dir = self.dir + ".old"
+        shutil.rmtree(new_dir, ignore_errors = True)
+        m5.checkpoint(new_dir)
+
+        with open(path.join(new_dir, "stats.txt"), "w") as stats:
+            stats.write(self.statsContent())
+        with open(path.join(new_dir, "resume.json"), "w") as state_file:
+            json.dump({
+                "phase": self.phase,
+                "tick": m5.curTick(),
+                "start_tick": self.start_tick,
+                "resumed_at": self.resumed_at,
+            }, state_file)
+
+        # Keep a complete checkpoint on disk at any time
+        if path.isdir(self.dir):
+            shutil.rmtree(old_dir, ignore_errors = True)
+            os.rename(self.dir, old_dir)
+        os.rename(new_dir, self.dir)
+        shutil.rmtree(old_dir, ignore_errors = True)
+        print("Checkpoint for resuming at tick {}".format(m5.curTick()))
+
+    def finish(self):
+        """
+        Called at the end of the run. Writes the stats of the whole run
+        to stats.txt and removes the checkpoint.
+        """
+        if self.stats_prefix or self.phase == "roi":
+            # gem5 keeps its stats.txt open, write a new file instead
+            stats_file = path.join(self.outdir, "stats.txt")
+            with open(stats_file + ".new", "w") as stats:
+                stats.write(self.statsContent())
+            os.replace(stats_file + ".new", stats_file)
+
+        for dir in [self.dir, self.dir + ".old", self.dir + ".new"]:
+            shutil.rmtree(dir, ignore_errors = True)
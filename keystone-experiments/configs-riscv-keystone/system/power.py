@@ -0,0 +1,168 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+
+import m5
+from m5.objects import *
+from os import path
+
+from stats_file import readStats
+
+'''
+Power and energy models of the system.
+
+MathExprPowerModel expressions are attached to the CPUs, their L1 and
+walker caches, the memory bus, the cluster crossbars (if any) and the
+memory controllers. They use the voltage and the clock of the clock
+domain of each object, so frequency and voltage scaling show up in the
+power. The DRAM power comes from the
+DRAMPower based rank stats of the memory controller.
+
+The coefficients are round numbers for a small 28nm-class core and
+32kB SRAM arrays, they are placeholders to be calibrated like the
+performance model. Each model adds dynamicPower and staticPower stats
+next to the other stats of its object. After the measured region the
+total average power and the energy of the region are written to
+power.json in the output directory.
+'''
+
+# Frequency in Hz of the clock domain of the modeled object
+FREQUENCY = "(1000000000000 / clock_period)"
+
+# Switched capacitance per cycle and per committed instruction (F)
+CPU_CYCLE_CAPACITANCE = 1e-10
+CPU_INST_CAPACITANCE = 1e-10
+# Leakage power at 1V (W)
+CPU_LEAKAGE = 0.1
+
+# Energy per access of an L1 (J at 1V) and its leakage (W at 1V)
+CACHE_ACCESS_ENERGY = 2e-11
+CACHE_LEAKAGE = 0.01
+
+# Energy per L1 miss through a crossbar (J at 1V) and its leakage
+XBAR_MISS_ENERGY = 2e-11
+XBAR_LEAKAGE = 0.01
+
+def powerModel(dyn, st, gated_st = "0"):
+    """
+    Returns a PowerModel with the given dynamic and static power
+    expressions in the ON state, gated_st in the CLK_GATED state and no
+    power in the other states.
+    """
+    return PowerModel(pm = [
+        MathExprPowerModel(dyn = dyn, st = st),
+        MathExprPowerModel(dyn = "0", st = gated_st),
+        MathExprPowerModel(dyn = "0", st = "0"),
+        MathExprPowerModel(dyn = "0", st = "0"),
+    ])
+
+def addPowerModels(system):
+    """
+    Attaches the power models to the system. Has to be called once the
+    system is under the Root, since the expressions use the stat paths.
+    """
+    modeled = []
+    for cpu in system.cpu:
+        cpu_path = cpu.path()
+        cpu.power_model = powerModel(
+            dyn = "voltage * voltage * {f} * ({cycle} + {inst} * "
+                  "{cpu}.ipc)".format(f = FREQUENCY, cpu = cpu_path,
+                  cycle = CPU_CYCLE_CAPACITANCE,
+                  inst = CPU_INST_CAPACITANCE),
+            st = "{} * voltage".format(CPU_LEAKAGE),
+            gated_st = "{} * voltage".format(CPU_LEAKAGE))
+        modeled.append(cpu)
+
+        for name in ["icache", "dcache", "mmucache"]:
+            if not hasattr(cpu, name):
+                continue
+            cache = getattr(cpu, name)
+            cache.power_model = powerModel(
+                dyn = "voltage * voltage * {} * {}.overallAccesses "
+                      "/ simSeconds".format(CACHE_ACCESS_ENERGY,
+                      cache.path()),
+                st = "{} * voltage".format(CACHE_LEAKAGE))
+            modeled.append(cache)
+
+    # MathExprPowerModel only evaluates Scalar and Formula stats, so the
+    # traffic of a crossbar is taken from the misses (a Formula) of the
+    # caches behind it instead of its packet count (a Vector2d). The
+    # walkers without a cache and the devices are not counted.
+    for xbar in [system.membus, *getattr(system, "cluster_buses", [])]:
+        caches = [cache for cpu, bus in zip(system.cpu, system._cpu_buses)
+                  if xbar in [system.membus, bus]
+                  for cache in [getattr(cpu, name, None) for name in
+                                ["icache", "dcache", "mmucache"]]
+                  if cache is not None]
+        misses = " + ".join("{}.overallMisses".format(cache.path())
+                            for cache in caches) or "0"
+        xbar.power_model = powerModel(
+            dyn = "voltage * voltage * {} * ({}) / simSeconds".format(
+                  XBAR_MISS_ENERGY, misses),
+            st = "{} * voltage".format(XBAR_LEAKAGE))
+        modeled.append(xbar)
+
+    # The DRAM ranks report their average power (mW) themselves
+    for ctrl in system.mem_cntrls:
+        ranks = ["{}.dram.rank{}.averagePower".format(ctrl.path(), i)
+                 for i in range(int(ctrl.dram.ranks_per_channel))]
+        ctrl.power_model = powerModel(
+            dyn = "({}) / 1000".format(" + ".join(ranks)), st = "0")
+        modeled.append(ctrl)
+
+    for obj in modeled:
+        obj.power_state.default_state = "ON"
+
+def reportPower(system):
+    """
+    Writes the average power of every modeled object in the last stats
+    dump, the total and the energy of the dumped region to power.json
+    and prints the total.
+    """
+    dump = readStats(path.join(m5.options.outdir, "stats.txt"))[-1]
+
+    components = {}
+    for name, value in dump.items():
+        for kind in ["dynamicPower", "staticPower"]:
+            if name.endswith(".power_model." + kind):
+                component = name[:-len(".power_model." + kind)]
+                components.setdefault(component, {})[kind] = value
+
+    power = sum(sum(values.values()) for values in components.values())
+    sim_seconds = dump.get("simSeconds", 0)
+    report = {
+        "sim_seconds": sim_seconds,
+        "average_power_w": power,
+        "energy_j": power * sim_seconds,
+        "components": components,
+    }
+    with open(path.join(m5.options.outdir, "power.json"), "w") as out:
+        json.dump(report, out, indent=4)
+
+    print("Average power: %.3fW, energy: %.6fJ" % (power,
+          report["energy_j"]))
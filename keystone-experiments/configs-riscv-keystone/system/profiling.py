@@ -0,0 +1,164 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import signal
+import subprocess
+import time
+
+import m5
+from m5.util import warn
+from os import path
+
+'''
+Host side profiling of the simulation.
+
+The run (config construction, DTB generation, instantiate and each
+simulate segment) is split into named phases. For each phase the host
+wall and CPU time are recorded, and for simulate phases the simulated
+ticks as well. The Python phases can be profiled with cProfile, and a
+sampling profiler (py-spy or perf) can be attached to the whole gem5
+process to see which SimObjects the event processing time goes to. The
+report is written to profile.json in the output directory at exit.
+
+The phases are marked with startPhase()/endPhase(), which do nothing if
+no HostProfiler was created.
+'''
+
+# Commands of the supported sampling profilers, {pid} and {out} are
+# replaced by the gem5 process id and the output file
+SAMPLERS = {
+    "py-spy": (["py-spy", "record", "--native", "--pid", "{pid}",
+                "--output", "{out}"], "profile_py-spy.svg"),
+    "perf": (["perf", "record", "-g", "--pid", "{pid}", "--output",
+              "{out}"], "profile_perf.data"),
+}
+
+class HostProfiler(object):
+
+    # The profiler used by startPhase() and endPhase()
+    current = None
+
+    def __init__(self, python = False, sampler = None):
+        self.phases = []
+        self.stack = []
+        self.python = cProfile.Profile() if python else None
+        self.start = time.time()
+        self.sampler = None
+
+        if sampler:
+            self.startSampler(sampler)
+
+        HostProfiler.current = self
+        atexit.register(self.write)
+
+    def startSampler(self, name):
+        command, out = SAMPLERS[name]
+        if not shutil.which(command[0]):
+            warn("{} not found, no sampled profile".format(command[0]))
+            return
+        self.sampler_out = path.join(m5.options.outdir, out)
+        self.sampler = subprocess.Popen([arg.format(pid = os.getpid(),
+                                         out = self.sampler_out)
+                                         for arg in command])
+
+    def stopSampler(self):
+        if self.sampler and self.sampler.poll() is None:
+            # Both samplers write their output on SIGINT
+            self.sampler.send_signal(signal.SIGINT)
+            self.sampler.wait()
+
+    def startPhase(self, name):
+        simulate = name.startswith("simulate")
+        # cProfile covers the outermost Python phases only
+        if self.python and not simulate and not self.stack:
+            self.python.enable()
+        self.stack.append((name, time.time(), time.process_time(),
+                           m5.curTick() if simulate else None))
+
+    def endPhase(self):
+        name, wall, cpu, tick = self.stack.pop()
+        if self.python and tick is None and not self.stack:
+            self.python.disable()
+        phase = {
+            "phase": name,
+            "parent": self.stack[-1][0] if self.stack else None,
+            "wall_seconds": time.time() - wall,
+            "cpu_seconds": time.process_time() - cpu,
+        }
+        if tick is not None:
+            phase["sim_ticks"] = m5.curTick() - tick
+            if phase["wall_seconds"]:
+                phase["sim_ticks_per_host_second"] = \
+                    phase["sim_ticks"] / phase["wall_seconds"]
+        self.phases.append(phase)
+
+    def write(self):
+        # Phases left open by an early exit end here
+        while self.stack:
+            self.endPhase()
+        self.stopSampler()
+
+        report = {
+            "total_wall_seconds": time.time() - self.start,
+            "phases": self.phases,
+        }
+        if self.sampler:
+            report["sampled_profile"] = self.sampler_out
+
+        if self.python:
+            prof = path.join(m5.options.outdir, "profile_python.prof")
+            self.python.dump_stats(prof)
+            summary = io.StringIO()
+            pstats.Stats(self.python, stream = summary) \
+                .sort_stats("cumulative").print_stats(30)
+            with open(path.join(m5.options.outdir,
+                                "profile_python.txt"), "w") as out:
+                out.write(summary.getvalue())
+            report["python_profile"] = prof
+
+        with open(path.join(m5.options.outdir, "profile.json"), "w") as out:
+            json.dump(report, out, indent=4)
+
+        print("Host profile:")
+        for phase in self.phases:
+            print("  {:<24} {:>10.2f}s".format(phase["phase"],
+                  phase["wall_seconds"]))
+
+def startPhase(name):
+    if HostProfiler.current:
+        HostProfiler.current.startPhase(name)
+
+def endPhase():
+    if HostProfiler.current:
+        HostProfiler.current.endPhase()
@@ -25,11 +25,17 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+import math
+
 import m5
 from m5.objects import *
 from m5.util import convert
 from os import path
 
+from .profiling import startPhase, endPhase
+from .cpu_presets import CPU_PRESETS
+from .branch_prediction import BRANCH_PREDICTORS
+
 '''
 This class creates a bare bones RISCV full system.
 
@@ -76,12 +82,79 @@ def generateDtb(system):
     fdt.writeDtsFile(path.join(m5.options.outdir, 'device.dts'))
     fdt.writeDtbFile(path.join(m5.options.outdir, 'device.dtb'))
 
+# CPU classes of the CPU types
+CPU_TYPES = {
+    "atomic": AtomicSimpleCPU,
+    "timing": TimingSimpleCPU,
+    "minor": MinorCPU,
+    "o3": DerivO3CPU,
+}
+
+def parseCores(spec):
+    """
+    Parses a heterogeneous core spec such as 1xminor,4xo3 into a list of
+    (count, CPU type or preset, L1 size) tuples. Each group can be a CPU
+    type or a CPU preset (e.g., 1xu54,4xboom-medium) and can have its
+    own L1 cache size (e.g., 1xminor:16kB,4xo3:32kB).
+    """
+    cores = []
+    for group in spec.split(","):
+        group, _, l1_size = group.partition(":")
+        count, _, kind = group.partition("x")
+        if not count.isdigit() or not kind:
+            m5.fatal("Invalid core group {} in {}".format(group, spec))
+        cores.append((int(count), kind, l1_size or None))
+    return cores
+
+class KeystoneHiFive(HiFive):
+    """
+    HiFive platform with an optional second VirtIO disk (payload_disk)
+    for the workload. The PLIC sources, the IO ranges and the device
+    tree of HiFive all follow _off_chip_devices().
+    """
+
+    def _off_chip_devices(self):
+        devices = super(KeystoneHiFive, self)._off_chip_devices()
+        if hasattr(self, "payload_disk"):
+            devices.append(self.payload_disk)
+        return devices
+
+class ClusterXBar(CoherentXBar):
+    """
+    Crossbar between the private caches of a cluster of CPUs and the
+    memory bus. Its snoop filter keeps the snoops of the other clusters
+    away from the caches of this one.
+    """
+    width = 64
+    frontend_latency = 1
+    forward_latency = 0
+    response_latency = 1
+    snoop_response_latency = 1
+    snoop_filter = SnoopFilter(lookup_latency = 0)
+
+def defaultMemSize(num_cpus):
+    """
+    Returns the memory size for num_cpus harts: 1GB up to 16 harts,
+    64MB per hart beyond (4GB with 64 harts).
+    """
+    return "{}MB".format(max(1024, 64 * num_cpus))
+
+def defaultMemChannels(num_cpus):
+    """ Returns one memory channel per 8 harts, a power of two up to 8 """
+    return min(8, 1 << int(math.log2(max(1, num_cpus // 8))))
+
 class RiscvSystem(System):
 
-    def __init__(self, sbi, disk, cpu_type, num_cpus):
+    def __init__(self, sbi, disk, cpu_type, num_cpus, disk_overlay = None,
+                 payload_disk = None, cpu_preset = None, bpred = None,
+                 walker_cache = "32kB", walker_monitor = False,
+                 cores = None, mem_size = None, mem_channels = None,
+                 cluster_size = 8):
         super(RiscvSystem, self).__init__()
 
-        # Set up the clock domain and the voltage domain
+        # Set up the clock domain and the voltage domain of the uncore
+        # (crossbars, memory controller, devices) and of the CPU cluster
+        # (the CPUs and their private caches)
         self.clk_domain = SrcClockDomain()
         self.clk_domain.clock = '3GHz'
         self.clk_domain.voltage_domain = VoltageDomain()
@@ -90,8 +163,11 @@ class RiscvSystem(System):
         self.cpu_clk_domain.clock = '3GHz'
 
         # DDR memory range starts from base address 0x80000000
-        # based on [1]
-        self.mem_ranges = [AddrRange(start=0x80000000, size='1024MB')]
+        # based on [1]. It grows with the number of harts.
+        num_harts = sum(count for count, _, _ in cores) if cores \
+                    else num_cpus
+        self.mem_ranges = [AddrRange(start=0x80000000,
+                           size=mem_size or defaultMemSize(num_harts))]
 
         # Create the main memory bus
         # This connects to main memory
@@ -104,22 +180,28 @@ class RiscvSystem(System):
         self.system_port = self.membus.cpu_side_ports
 
         # Create the CPUs for our system.
-        self.createCPU(cpu_type, num_cpus)
+        self.createCPU(cpu_type, num_cpus, cpu_preset, bpred, cores)
+        for cpu in self.cpu:
+            cpu.clk_domain = self.cpu_clk_domain
+
+        # Crossbars of the CPU clusters, if there is more than one
+        self.createInterconnect(cluster_size)
 
         # HiFive platform
         # This is based on a HiFive RISCV board and has
         # only a limited number of devices so far i.e.
         # PLIC, CLINT, UART, VirtIOMMIO
-        self.platform = HiFive()
+        self.platform = KeystoneHiFive()
 
         # create and intialize devices currently supported for RISCV
-        self.initDevices(self.membus, disk)
+        self.initDevices(self.membus, disk, disk_overlay, payload_disk)
 
         # Create the cache heirarchy for the system.
-        self.createCacheHierarchy()
+        self.createCacheHierarchy(walker_cache, walker_monitor)
 
-        # Create the memory controller
-        self.createMemoryControllerDDR3()
+        # Create the memory controllers
+        self.createMemoryControllerDDR3(mem_channels or
+                                        defaultMemChannels(len(self.cpu)))
 
         self.setupInterrupts()
 
@@ -132,7 +214,9 @@ class RiscvSystem(System):
         self.workload.object_file = sbi
 
         # Generate DTB (from configs/example/riscv/fs_linux.py)
+        startPhase("dtb")
         generateDtb(self)
+        endPhase()
         self.workload.dtb_filename = path.join(m5.options.outdir, 'device.dtb')
         # Default DTB address if bbl is bulit with --with-dts option
         self.workload.dtb_addr = 0x87e00000
@@ -146,44 +230,104 @@ class RiscvSystem(System):
         ]
         self.workload.command_line = " ".join(kernel_cmd)
 
-    def createCPU(self, cpu_type, num_cpus):
+    def createCPU(self, cpu_type, num_cpus, cpu_preset = None,
+                  bpred = None, cores = None):
+        """
+        Creates num_cpus CPUs of cpu_type (or of cpu_preset), or the
+        groups of CPUs given by cores (see parseCores). The CPUs are
+        numbered in order, the hart IDs and the DTB cpu nodes follow.
+        """
+        # A preset replaces the minor or o3 CPU with a calibrated one
+        if cpu_preset:
+            preset_type, _ = CPU_PRESETS[cpu_preset]
+            if preset_type != cpu_type:
+                m5.fatal("CPU preset {} needs the {} CPU type".format(
+                         cpu_preset, preset_type))
+        if not cores:
+            cores = [(num_cpus, cpu_preset or cpu_type, None)]
+
+        self.cpu = []
+        self._cpu_types = []
+        self._l1_sizes = []
+        for count, kind, l1_size in cores:
+            if kind in CPU_PRESETS:
+                kind_type, cpu_class = CPU_PRESETS[kind]
+            elif kind in CPU_TYPES:
+                kind_type, cpu_class = kind, CPU_TYPES[kind]
+            else:
+                m5.fatal("No CPU type {}".format(kind))
+            for i in range(count):
+                self.cpu.append(cpu_class(cpu_id = len(self.cpu)))
+                self._cpu_types.append(kind_type)
+                self._l1_sizes.append(l1_size)
+
         # the default cpu will be atomic cpu
-        if cpu_type == "atomic":
-            self.cpu = [AtomicSimpleCPU(cpu_id = i)
-                              for i in range(num_cpus)]
+        if all(kind == "atomic" for kind in self._cpu_types):
             self.mem_mode = 'atomic'
-
-            for cpu in self.cpu:
-                cpu.createThreads()
-
-        elif cpu_type == "timing":
-            self.cpu = [TimingSimpleCPU(cpu_id = i)
-                                    for i in range(num_cpus)]
-            self.mem_mode = 'timing'
-            for cpu in self.cpu:
-                cpu.createThreads()
-
-        elif cpu_type == "minor":
-            self.cpu = [MinorCPU(cpu_id = i)
-                                    for i in range(num_cpus)]
+        elif "atomic" in self._cpu_types:
+            m5.fatal("Atomic CPUs cannot be mixed with other CPU types")
+        else:
             self.mem_mode = 'timing'
-            for cpu in self.cpu:
-                cpu.createThreads()
 
-        elif cpu_type == "o3":
-            self.cpu = [DerivO3CPU(cpu_id = i)
-                                    for i in range(num_cpus)]
-            self.mem_mode = 'timing'
-            for cpu in self.cpu:
-                cpu.createThreads()
-        else:
-            m5.fatal("No CPU type {}".format(cpu_type))
+        for cpu in self.cpu:
+            cpu.createThreads()
+
+        # Branch predictor of the detailed CPUs
+        if bpred:
+            if not self.hasDetailedCPUs():
+                m5.fatal("--bpred needs the minor or o3 CPU type")
+            for cpu, kind in zip(self.cpu, self._cpu_types):
+                if kind in ("minor", "o3"):
+                    cpu.branchPred = BRANCH_PREDICTORS[bpred]()
+
+    def cpuTypes(self):
+        """ Returns the CPU type (atomic, timing, minor, o3) of each CPU """
+        return list(self._cpu_types)
+
+    def hasDetailedCPUs(self, all_cpus = False):
+        """ Returns whether any (or all) of the CPUs are minor or o3 """
+        detailed = [kind in ("minor", "o3") for kind in self._cpu_types]
+        return all(detailed) if all_cpus else any(detailed)
+
+    def assignEventQueues(self):
+        """
+        Puts each CPU, together with its private caches, walker cache
+        and interrupt controller (its children), on its own event queue
+        so that it is simulated by a separate host thread. The crossbars,
+        the memory and the platform devices stay on event queue 0.
+        """
+        for i, cpu in enumerate(self.cpu):
+            cpu.eventq_index = i + 1
 
     def switchCpus(self, old, new):
         assert(new[0].switchedOut())
         m5.switchCpus(self, list(zip(old, new)))
 
-    def createCacheHierarchy(self):
+    def createInterconnect(self, cluster_size = 8):
+        """
+        Groups the CPUs into clusters of cluster_size, each with its own
+        crossbar to the memory bus. With a single cluster (or no
+        cluster_size) the private caches connect to the memory bus.
+        """
+        if not cluster_size or len(self.cpu) <= cluster_size:
+            self._cpu_buses = [self.membus] * len(self.cpu)
+            return
+
+        num_clusters = (len(self.cpu) + cluster_size - 1) // cluster_size
+        self.cluster_buses = [ClusterXBar() for i in range(num_clusters)]
+        for bus in self.cluster_buses:
+            bus.mem_side_ports = self.membus.cpu_side_ports
+        self._cpu_buses = [self.cluster_buses[i // cluster_size]
+                           for i in range(len(self.cpu))]
+
+    def createCacheHierarchy(self, walker_cache = "32kB",
+                             walker_monitor = False):
+        """
+        Creates private L1 instruction and data caches for each CPU and
+        a cache of walker_cache size for its page table walkers ("none"
+        to connect the walkers to the memory bus). With walker_monitor,
+        a CommMonitor records the latency of the page table accesses.
+        """
         class L1Cache(Cache):
             """Simple L1 Cache with default values"""
 
@@ -199,45 +343,171 @@ class RiscvSystem(System):
             def __init__(self):
                 super(L1Cache, self).__init__()
 
-        for cpu in self.cpu:
+        for cpu, l1_size, bus in zip(self.cpu, self._l1_sizes,
+                                     self._cpu_buses):
             # Create a very simple cache hierarchy
 
-            # Create an L1 instruction, data and mmu cache
+            # Create an L1 instruction and data cache
             cpu.icache = L1Cache()
             cpu.dcache = L1Cache()
-            cpu.mmucache = L1Cache()
+            if l1_size:
+                cpu.icache.size = l1_size
+                cpu.dcache.size = l1_size
 
             # Connecting icache and dcache to memory bus and cpu
-            cpu.icache.mem_side = self.membus.cpu_side_ports
-            cpu.dcache.mem_side = self.membus.cpu_side_ports
+            cpu.icache.mem_side = bus.cpu_side_ports
+            cpu.dcache.mem_side = bus.cpu_side_ports
 
             cpu.icache.cpu_side = cpu.icache_port
             cpu.dcache.cpu_side = cpu.dcache_port
 
-            # Need a new crossbar for mmucache
-
-            cpu.mmucache.mmubus = L2XBar()
-
-            cpu.mmucache.cpu_side = cpu.mmucache.mmubus.mem_side_ports
-            cpu.mmucache.mem_side = self.membus.cpu_side_ports
+            # Need a new crossbar for the walkers of the itb and dtb
+            if walker_cache == "none":
+                cpu.mmubus = L2XBar()
+                walker_bus = cpu.mmubus
+            else:
+                cpu.mmucache = L1Cache()
+                cpu.mmucache.size = walker_cache
+                cpu.mmucache.mmubus = L2XBar()
+                walker_bus = cpu.mmucache.mmubus
+
+            walker_port = walker_bus.mem_side_ports
+            if walker_monitor:
+                cpu.walker_monitor = CommMonitor()
+                cpu.walker_monitor.cpu_side_port = walker_port
+                walker_port = cpu.walker_monitor.mem_side_port
+
+            if walker_cache == "none":
+                bus.cpu_side_ports = walker_port
+            else:
+                cpu.mmucache.cpu_side = walker_port
+                cpu.mmucache.mem_side = bus.cpu_side_ports
 
             # Connect the itb and dtb to mmucache
             cpu.mmu.connectWalkerPorts(
-                cpu.mmucache.mmubus.cpu_side_ports, cpu.mmucache.mmubus.cpu_side_ports)
-
+                walker_bus.cpu_side_ports, walker_bus.cpu_side_ports)
 
     def setupInterrupts(self):
         for cpu in self.cpu:
             # create the interrupt controller CPU and connect to the membus
             cpu.createInterruptController()
 
-    def createMemoryControllerDDR3(self):
-        self.mem_cntrls = [
-            MemCtrl(dram = DDR3_1600_8x8(range = self.mem_ranges[0]),
-                    port = self.membus.mem_side_ports)
-        ]
+    def createMemoryControllerDDR3(self, channels = 1):
+        """
+        Creates channels memory controllers, interleaved on cache lines
+        (channels has to be a power of two).
+        """
+        if channels & (channels - 1):
+            m5.fatal("The number of memory channels has to be a power "
+                     "of two")
+        mem_range = self.mem_ranges[0]
+        intlv_bits = int(math.log2(channels))
+        # Above the 64 bytes of a cache line
+        intlv_low_bit = 6
+        self.mem_cntrls = []
+        for i in range(channels):
+            if channels > 1:
+                channel_range = AddrRange(mem_range.start,
+                    size = mem_range.size(),
+                    intlvHighBit = intlv_low_bit + intlv_bits - 1,
+                    xorHighBit = 0, intlvBits = intlv_bits,
+                    intlvMatch = i)
+            else:
+                channel_range = mem_range
+            self.mem_cntrls.append(
+                MemCtrl(dram = DDR3_1600_8x8(range = channel_range),
+                        port = self.membus.mem_side_ports))
+
+    def setDRAM(self, dram):
+        """
+        Replaces the DRAM of the memory controllers with the gem5 DRAM
+        interface of the given name (e.g., DDR4_2400_8x8).
+        """
+        dram_class = getattr(m5.objects, dram, None)
+        if not (isinstance(dram_class, type) and
+                issubclass(dram_class, DRAMInterface)):
+            m5.fatal("No DRAM interface {}".format(dram))
+        for ctrl in self.mem_cntrls:
+            ctrl.dram = dram_class(range = ctrl.dram.range)
+
+    def setClocks(self, cpu_clock = None, uncore_clock = None,
+                  cpu_voltage = None, uncore_voltage = None):
+        """
+        Sets the clocks and the voltages of the CPU cluster and of the
+        uncore. Values left as None keep their defaults.
+        """
+        if cpu_clock:
+            self.cpu_clk_domain.clock = cpu_clock
+        if cpu_voltage:
+            self.cpu_clk_domain.voltage_domain.voltage = cpu_voltage
+        if uncore_clock:
+            self.clk_domain.clock = uncore_clock
+        if uncore_voltage:
+            self.clk_domain.voltage_domain.voltage = uncore_voltage
+
+    def enableDVFS(self, operating_points, init_level = 0,
+                   transition_latency = '100us'):
+        """
+        Gives the CPU cluster the given operating points ((clock, voltage)
+        pairs) and registers it with the DVFS handler. The cluster starts
+        at operating point init_level, counted from the fastest one.
+        """
+        operating_points = sorted(operating_points, reverse = True,
+            key = lambda point: convert.toFrequency(point[0]))
+        self.cpu_clk_domain.clock = [clock for clock, _ in operating_points]
+        self.cpu_clk_domain.voltage_domain.voltage = \
+            [voltage for _, voltage in operating_points]
+        self.cpu_clk_domain.domain_id = 0
+        self.cpu_clk_domain.init_perf_level = init_level
+
+        self.dvfs_handler.domains = [self.cpu_clk_domain]
+        self.dvfs_handler.sys_clk_domain = self.clk_domain
+        self.dvfs_handler.transition_latency = transition_latency
+        self.dvfs_handler.enable = True
+
+    def setL1Latency(self, latency):
+        """ Sets the tag, data and response latencies of the L1 caches """
+        for cpu in self.cpu:
+            for cache in [cpu.icache, cpu.dcache,
+                          getattr(cpu, "mmucache", None)]:
+                if not cache:
+                    continue
+                cache.tag_latency = latency
+                cache.data_latency = latency
+                cache.response_latency = latency
+
+    def setTLBSizes(self, itlb_entries = None, dtlb_entries = None):
+        """ Sets the number of entries of the (fully associative) TLBs """
+        for cpu in self.cpu:
+            if itlb_entries:
+                cpu.mmu.itb.size = itlb_entries
+            if dtlb_entries:
+                cpu.mmu.dtb.size = dtlb_entries
+
+    def setWalkerCacheMSHRs(self, mshrs):
+        """
+        Limits the page table accesses in flight per CPU through the MSHRs
+        of its walker cache.
+        """
+        for cpu in self.cpu:
+            cpu.mmucache.mshrs = mshrs
+
+    def setCpuParams(self, params):
+        """
+        Sets parameters of all CPUs from name=value strings. Names can
+        refer to children of the CPUs (e.g., branchPred.BTBEntries).
+        """
+        for param in params:
+            name, _, value = param.partition("=")
+            *children, name = name.split(".")
+            for cpu in self.cpu:
+                obj = cpu
+                for child in children:
+                    obj = getattr(obj, child)
+                setattr(obj, name, value)
 
-    def initDevices(self, membus, disk):
+    def initDevices(self, membus, disk, disk_overlay = None,
+                    payload_disk = None):
 
         self.iobus = IOXBar()
         #self.intrctrl = IntrControl()
@@ -254,6 +524,11 @@ class RiscvSystem(System):
         # VirtIOMMIO
         image = CowDiskImage(child=RawDiskImage(read_only=True), read_only=False)
         image.child.image_file = disk
+        # The copy-on-write layer is kept in memory unless a file is given.
+        # If the file exists it is used as the initial layer, and the layer
+        # is written back to it when the simulation exits.
+        if disk_overlay:
+            image.image_file = disk_overlay
         # using reserved memory space
         self.platform.disk = MmioVirtIO(
             vio=VirtIOBlock(image=image),
@@ -262,6 +537,17 @@ class RiscvSystem(System):
             pio_addr=0x10008000
         )
 
+        # Second disk with the workload, it shows up as /dev/vdb in
+        # the guest. It is only read, so no copy-on-write layer.
+        if payload_disk:
+            self.platform.payload_disk = MmioVirtIO(
+                vio=VirtIOBlock(image=RawDiskImage(read_only=True,
+                                                   image_file=payload_disk)),
+                interrupt_id=0x9,
+                pio_size = 4096,
+                pio_addr=0x10009000
+            )
+
         # From riscv/fs_linux.py
         uncacheable_range = [
             *self.platform._on_chip_ranges(),
@@ -290,4 +576,8 @@ class RiscvSystem(System):
         # Attach the PLIC (platform level interrupt controller)
         # to the platform. This initializes the PLIC with
         # interrupt sources coming from off chip devices
-        self.platform.attachPlic()
\ No newline at end of file
+        self.platform.attachPlic()
+
+        # An M-mode and an S-mode PLIC context and a CLINT timer and
+        # software interrupt per hart
+        self.platform.setNumCores(len(self.cpu))
\ No newline at end of file
@@ -0,0 +1,99 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+import re
+
+import m5
+from os import path
+
+from stats_file import ratio, readStats
+
+'''
+Address translation report.
+
+Summarizes the TLB and page table walker stats of the last stats dump
+per CPU: accesses, misses and miss rates of the ITLB and DTLB, the miss
+rate of the walker cache and, with a walker monitor, the latency
+histogram of the page table accesses. Written to translation.json in the
+output directory.
+
+The RISC-V TLBs of gem5 are fully associative and the walkers do not
+record the latency of whole walks, so the latencies are those of the
+single page table accesses (up to three per walk with Sv39).
+'''
+
+def reportTranslation(system):
+    """
+    Writes the TLB and walker stats of each CPU in the last stats dump to
+    translation.json and prints them.
+    """
+    dump = readStats(path.join(m5.options.outdir, "stats.txt"))[-1]
+
+    report = {}
+    for cpu in system.cpu:
+        prefix = cpu.path()
+        stat = lambda name: dump.get(prefix + "." + name, 0)
+        cpu_report = {}
+        for tlb in ["itb", "dtb"]:
+            accesses = stat("mmu.{}.accesses".format(tlb))
+            misses = stat("mmu.{}.misses".format(tlb))
+            cpu_report[tlb] = {
+                "entries": int(getattr(cpu.mmu, tlb).size),
+                "accesses": accesses,
+                "misses": misses,
+                "miss_rate": ratio(misses, accesses),
+            }
+
+        if hasattr(cpu, "mmucache"):
+            cpu_report["walker_cache"] = {
+                "size": str(cpu.mmucache.size),
+                "accesses": stat("mmucache.overallAccesses::total"),
+                "miss_rate": stat("mmucache.overallMissRate::total"),
+            }
+
+        if hasattr(cpu, "walker_monitor"):
+            hist = prefix + ".walker_monitor.readLatencyHist::"
+            buckets = {name[len(hist):]: value
+                       for name, value in dump.items()
+                       if name.startswith(hist) and
+                          re.match(r"^\d+-\d+$", name[len(hist):])}
+            cpu_report["walk_access_latency"] = {
+                "samples": dump.get(hist + "samples", 0),
+                "mean_ticks": dump.get(hist + "mean"),
+                "histogram_ticks": buckets,
+            }
+        report[cpu.path()] = cpu_report
+
+    with open(path.join(m5.options.outdir, "translation.json"), "w") as out:
+        json.dump(report, out, indent=4)
+
+    for name, cpu in report.items():
+        print("{}: ITLB miss rate {}, DTLB miss rate {}".format(name,
+              *["{:.2%}".format(cpu[tlb]["miss_rate"])
+                if cpu[tlb]["miss_rate"] is not None else "-"
+                for tlb in ["itb", "dtb"]]))
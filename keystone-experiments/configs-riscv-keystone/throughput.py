@@ -0,0 +1,236 @@
+#Copyright (c) 2021 The Regents of the University of California.
+#All Rights Reserved
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Simulator throughput regression tracker.
+
+Runs short, fixed windows of the keystone workloads under each CPU model
+from a post-boot checkpoint (restored from the checkpoint library) and
+records the host time and the host instruction rate of each window in a
+history file. A window that is significantly slower than the rolling
+baseline of the previous runs is flagged and the exit code is non-zero.
+
+Two windows are measured per run: "restore", from the restored
+checkpoint to the start marker (loading the keystone driver), and the
+benchmark window of --roi-insts instructions after --warmup-insts.
+
+    python3 throughput.py [gem5 binary] [fw_payload.elf] [rootfs.ext2] \\
+        --ckpt-library [library] --benchmarks aes,qsort
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from stats_file import readJson, readStats
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# One-sided 99% critical values of Student's t for 1 to 30 degrees of
+# freedom, used for the prediction interval of the baseline
+T_99 = [31.82, 6.965, 4.541, 3.747, 3.365, 3.143, 2.998, 2.896, 2.821,
+        2.764, 2.718, 2.681, 2.650, 2.624, 2.602, 2.583, 2.567, 2.552,
+        2.539, 2.528, 2.518, 2.508, 2.500, 2.492, 2.485, 2.479, 2.473,
+        2.467, 2.462, 2.457]
+
+# Fields of a record that have to match for it to be in the baseline
+# of another one (the restore window also depends on the benchmark)
+BASELINE_FIELDS = ["window", "bench", "cpu", "num_cpus", "script",
+                   "warmup_insts", "roi_insts", "host"]
+
+def parse_options():
+    parser = argparse.ArgumentParser(description='Measures the host speed '
+                'of gem5 on fixed windows and flags slowdowns.')
+    parser.add_argument("gem5", help="Path to the gem5 binary")
+    parser.add_argument("sbi", help="Path to the opensbi binary with "
+                        "kernel payload")
+    parser.add_argument("disk", help="Path to the disk image")
+    parser.add_argument("--ckpt-library", required=True,
+                        help="Checkpoint library with (or for) the "
+                        "post-boot checkpoint")
+    parser.add_argument("--script", default="run_untrusted.py",
+                        help="Run script to use (default: %(default)s)")
+    parser.add_argument("--cpus", default="atomic,timing,minor,o3",
+                        help="CPU models (default: %(default)s)")
+    parser.add_argument("--num-cpus", type=int, default=1)
+    parser.add_argument("--benchmarks", default="aes",
+                        help="Comma separated rv8 benchmarks "
+                        "(default: %(default)s)")
+    parser.add_argument("--warmup-insts", type=int, default=1000000)
+    parser.add_argument("--roi-insts", type=int, default=10000000)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per point, the fastest one is kept")
+    parser.add_argument("--history", default=os.path.join(CONFIG_DIR,
+                        "throughput_history.jsonl"),
+                        help="History file (default: %(default)s)")
+    parser.add_argument("--baseline", type=int, default=10,
+                        help="Number of previous results in the rolling "
+                        "baseline (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="Minimum relative slowdown to flag "
+                        "(default: %(default)s)")
+    parser.add_argument("--outdir", default="throughput-out",
+                        help="Directory for the gem5 output directories")
+    return parser.parse_args()
+
+def gitRevision():
+    """ Returns the commit of this repository (with + if modified) """
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "HEAD"],
+            cwd = CONFIG_DIR, text = True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"],
+                                cwd = CONFIG_DIR)
+        return rev + ("+" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runWindow(args, cpu, bench, outdir):
+    """
+    Runs one point and returns the measured windows as a dictionary
+    (window name -> host seconds and rates) or None if the run failed.
+    """
+    command = [args.gem5, "-re", "-d", outdir,
+               os.path.join(CONFIG_DIR, args.script),
+               "--ckpt-library", args.ckpt_library, "--profile",
+               "--warmup-insts", str(args.warmup_insts),
+               "--roi-insts", str(args.roi_insts),
+               args.sbi, args.disk, cpu, str(args.num_cpus), bench]
+    if subprocess.call(command) != 0:
+        return None
+
+    profile = readJson(outdir, "profile.json")
+    phases = {phase["phase"]: phase for phase in profile["phases"]}
+    stats = readStats(os.path.join(outdir, "stats.txt"))[-1]
+
+    roi = phases["simulate:roi"]
+    windows = {
+        "restore": {
+            "host_seconds": phases["simulate:boot"]["wall_seconds"],
+            "sim_ticks_per_host_second":
+                phases["simulate:boot"].get("sim_ticks_per_host_second"),
+        },
+        bench: {
+            "host_seconds": roi["wall_seconds"],
+            "sim_ticks_per_host_second": roi.get("sim_ticks_per_host_second"),
+            "host_inst_rate": stats.get("simInsts", 0) / roi["wall_seconds"]
+                              if roi["wall_seconds"] else None,
+        },
+    }
+    return windows
+
+def readHistory(file_name):
+    if not os.path.isfile(file_name):
+        return []
+    with open(file_name) as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+def checkSlowdown(history, record, baseline, threshold):
+    """
+    Compares the host seconds of record with the last baseline results
+    of the same configuration on the same host (BASELINE_FIELDS).
+    Returns a message if the record is slower than the upper 99%
+    prediction bound of the baseline and by more than threshold, None
+    otherwise.
+    """
+    previous = [old["host_seconds"] for old in history
+                if all(old.get(field) == record[field]
+                       for field in BASELINE_FIELDS)][-baseline:]
+    if len(previous) < 3:
+        return None
+
+    mean = statistics.mean(previous)
+    sd = statistics.stdev(previous)
+    t = T_99[min(len(previous) - 1, len(T_99)) - 1]
+    bound = mean + t * sd * math.sqrt(1 + 1 / len(previous))
+    slowdown = record["host_seconds"] / mean - 1
+
+    if record["host_seconds"] > bound and slowdown > threshold:
+        return "{} ({}) on {}: {:.2f}s is {:.0%} slower than the " \
+               "baseline ({:.2f}s +- {:.2f}s over {} runs)".format(
+               record["window"], record["bench"], record["cpu"],
+               record["host_seconds"], slowdown, mean, sd, len(previous))
+    return None
+
+def main():
+    args = parse_options()
+    history = readHistory(args.history)
+    revision = gitRevision()
+    host = platform.node()
+
+    # Make sure the checkpoint exists, booting with the fastest model
+    runWindow(args, "atomic", args.benchmarks.split(",")[0],
+              os.path.join(args.outdir, "checkpoint"))
+
+    records = []
+    for cpu in args.cpus.split(","):
+        for bench in args.benchmarks.split(","):
+            runs = []
+            for i in range(args.repeat):
+                outdir = os.path.join(args.outdir,
+                                      "{}-{}-{}".format(cpu, bench, i))
+                windows = runWindow(args, cpu, bench, outdir)
+                if windows is None:
+                    print("Run {} failed".format(outdir))
+                    continue
+                runs.append(windows)
+            for window in (["restore", bench] if runs else []):
+                best = min((run[window] for run in runs),
+                           key = lambda result: result["host_seconds"])
+                record = dict(best, window = window, bench = bench,
+                              cpu = cpu, num_cpus = args.num_cpus,
+                              script = os.path.basename(args.script),
+                              warmup_insts = args.warmup_insts,
+                              roi_insts = args.roi_insts,
+                              revision = revision, host = host,
+                              time = time.time())
+                records.append(record)
+
+    slowdowns = []
+    for record in records:
+        message = checkSlowdown(history, record, args.baseline,
+                                args.threshold)
+        if message:
+            slowdowns.append(message)
+        print("{:<10} {:<10} {:<8} {:>10.2f}s".format(record["window"],
+              record["bench"], record["cpu"], record["host_seconds"]))
+
+    with open(args.history, "a") as out:
+        for record in records:
+            out.write(json.dumps(record) + "\n")
+
+    for message in slowdowns:
+        print("SLOWDOWN: " + message)
+    sys.exit(1 if slowdowns else 0)
+
+if __name__ == "__main__":
+    main()